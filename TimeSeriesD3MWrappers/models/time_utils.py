@@ -0,0 +1,414 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# define time constants
+SECONDS_PER_MINUTE = 60
+MINUTES_PER_HOUR = 60
+HOURS_PER_DAY = 24
+DAYS_PER_WEEK = 7
+DAYS_PER_MONTH = [28, 30, 31]
+DAYS_PER_YEAR = [365, 366]
+
+S_PER_YEAR_0 = (
+    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_YEAR[0]
+)
+S_PER_YEAR_1 = (
+    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_YEAR[1]
+)
+S_PER_MONTH_28 = (
+    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[0]
+)
+S_PER_MONTH_30 = (
+    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[1]
+)
+S_PER_MONTH_31 = (
+    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[2]
+)
+S_PER_WEEK = SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_WEEK
+S_PER_DAY = SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY
+S_PER_HR = SECONDS_PER_MINUTE * MINUTES_PER_HOUR
+
+NS_PER_S = 10 ** 9
+
+# (seconds per period, pandas frequency alias, granularity) of time steps, in order of 
+# precedence: a time step has the granularity of the first period it is a multiple of
+FREQUENCIES = [
+    (S_PER_YEAR_0, "YS", "years"),
+    (S_PER_YEAR_1, "YS", "years"),
+    (S_PER_MONTH_30, "M", "months 30"),
+    (S_PER_MONTH_31, "M", "months 31"),
+    (S_PER_MONTH_28, "M", "months 28"),
+    (S_PER_WEEK, "W", "weeks"),
+    (S_PER_DAY, "D", "days"),
+    (S_PER_HR, "H", "hours"),
+    (SECONDS_PER_MINUTE, "min", "minutes"),
+    (1, "S", "seconds"),
+]
+
+# seconds per discretization period of each pandas frequency alias, its first period in FREQUENCIES
+FREQUENCY_PERIODS = {
+    alias: period for period, alias, granularity in reversed(FREQUENCIES)
+}
+
+# (pd.DateOffset unit, months per period) of calendar frequencies, whose periods vary in length
+CALENDAR_UNITS = {"YS": ("years", 12), "M": ("months", 1)}
+
+
+def _round_divide(numerator, denominator):
+    """ exact integer division, rounded half to even like python's round()
+
+    Arguments:
+        numerator {np array} -- int64 dividends
+        denominator {int} -- positive divisor
+
+    Returns:
+        np array -- int64 rounded quotients
+    """
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice_remainder = 2 * remainder
+    round_up = (twice_remainder > denominator) | (
+        (twice_remainder == denominator) & (quotient % 2 == 1)
+    )
+    return quotient + round_up
+
+
+def _truncate_divide(numerator, denominator):
+    """ division truncated towards zero like int(), exact if the dividends are integers
+
+    Arguments:
+        numerator {np array} -- dividends
+        denominator {int} -- positive divisor
+
+    Returns:
+        np array -- truncated quotients
+    """
+    if np.issubdtype(numerator.dtype, np.integer):
+        return np.sign(numerator) * (np.abs(numerator) // denominator)
+    return np.trunc(numerator / denominator)
+
+
+def discretize_datetimes(times, initial_time, frequency):
+    """ discretizes a sequence of datetimes as the number of periods of granularity 'frequency'
+        since 'initial_time' (rounded to the nearest period)
+
+    Arguments:
+        times {Sequence[datetime]} -- sequence of datetime objects
+        initial_time {datetime} -- datetime instance from which to offset times
+        frequency {str} -- string alias representing granularity of pd.datetime object
+
+    Returns:
+        np array -- (N,) int64 prediction intervals expressed at specific time granularity
+    """
+
+    # take differences as int64 nanoseconds
+    time_differences = pd.DatetimeIndex(times) - pd.Timestamp(initial_time)
+    time_differences = np.asarray(time_differences, dtype="timedelta64[ns]").view(np.int64)
+
+    period = FREQUENCY_PERIODS[frequency]
+    return _round_divide(time_differences, period * NS_PER_S)
+
+
+def discretize_numeric_times(times, initial_time, time_diff, integer_timestamps=False):
+    """ discretizes a sequence of numeric timestamps (in seconds) as 0-indexed intervals
+        after 'initial_time', at the granularity implied by 'time_diff'
+
+    Arguments:
+        times {Sequence[int or float]} -- sequence of timestamps
+        initial_time {int or float} -- timestamp from which to offset times
+        time_diff {int or float} -- difference between consecutive timestamps in training set,
+            used to calculate granularity for discretization
+
+    Keyword Arguments:
+        integer_timestamps {bool} -- whether timestamps are integers (days) or seconds
+
+    Returns:
+        np array -- (N,) int64 prediction intervals expressed at specific time granularity
+    """
+
+    times = np.asarray(times)
+
+    # edge case for integer timestamps
+    if integer_timestamps:
+        return (times - initial_time - 1).astype(np.int64)
+
+    # take differences to convert to timedeltas
+    time_differences = times - initial_time
+
+    period = FREQUENCY_PERIODS[frequency_alias(time_diff)]
+    time_differences = _truncate_divide(time_differences, period)
+
+    # we subtract one from differences because we want intervals to be 0 indexed
+    return time_differences.astype(np.int64) - 1
+
+
+def datetime_nanoseconds(times):
+    """ converts a sequence of datetimes to int64 nanoseconds since the epoch
+
+    Arguments:
+        times {Sequence[datetime]} -- sequence of datetime objects
+
+    Returns:
+        np array -- (N,) int64 nanoseconds
+    """
+
+    return np.asarray(pd.DatetimeIndex(times), dtype="datetime64[ns]").view(np.int64)
+
+
+def frequency_alias(seconds):
+    """ maps a time step to the pandas frequency alias of its granularity
+
+    Arguments:
+        seconds {int or float} -- time step in seconds
+
+    Returns:
+        str -- string alias representing granularity of pd.datetime object
+    """
+
+    for period, alias, granularity in FREQUENCIES:
+        if seconds >= period and seconds % period == 0:
+            logger.debug(f"granularity is {granularity}")
+            return alias
+    logger.debug("granularity is seconds")
+    return "S"
+
+
+def frequency_grid(start, end, frequency):
+    """ builds a regular time grid at a training frequency anchored at its first time, i.e. 
+        start + k periods for k >= 0 up to end, so that calendar frequencies keep the day of the 
+        month (or year) of start instead of snapping to period ends
+
+    Arguments:
+        start {datetime} -- first time of the grid
+        end {datetime} -- last time the grid may reach
+        frequency {str} -- string alias representing granularity of pd.datetime object
+
+    Returns:
+        pd DatetimeIndex -- grid times, at least start
+    """
+
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if frequency in CALENDAR_UNITS:
+        months = 12 * (end.year - start.year) + end.month - start.month
+        unit, months_per_period = CALENDAR_UNITS[frequency]
+        grid = pd.DatetimeIndex(
+            [
+                start + pd.DateOffset(**{unit: k})
+                for k in range(max(months // months_per_period, 0) + 1)
+            ]
+        )
+    else:
+        step = pd.Timedelta(seconds=FREQUENCY_PERIODS[frequency])
+        grid = pd.date_range(start, periods=max((end - start) // step, 0) + 1, freq=step)
+    return grid[: max(grid.searchsorted(end, side="right"), 1)]
+
+
+def time_step_counts(times, series=None):
+    """ counts the positive differences between consecutive times of the same series
+
+    Arguments:
+        times {np array} -- (N,) numeric times, in any order
+
+    Keyword Arguments:
+        series {np array} -- (N,) integer code of the series of each time, all times belong to 
+            the same series if None (default: {None})
+
+    Returns:
+        np array -- sorted distinct differences
+        np array -- number of occurrences of each difference
+    """
+
+    times = np.asarray(times)
+    if series is None:
+        order = np.argsort(times, kind="mergesort")
+        same_series = True
+    else:
+        series = np.asarray(series)
+        order = np.lexsort((times, series))
+        same_series = series[order][1:] == series[order][:-1]
+    differences = np.diff(times[order])
+    return np.unique(differences[same_series & (differences > 0)], return_counts=True)
+
+
+def most_common_step(steps, counts):
+    """ picks the most common time step, the smallest one on ties
+
+    Arguments:
+        steps {np array} -- sorted distinct time steps
+        counts {np array} -- number of occurrences of each time step
+
+    Returns:
+        int or float -- most common time step, None if there are no time steps
+    """
+
+    if not len(steps):
+        return None
+    return steps[np.argmax(counts)]
+
+
+def infer_time_step(times, series=None):
+    """ infers the time step of one or more time series as the most common positive difference 
+        between consecutive times of the same series, so that missing observations, duplicated 
+        times and irregular spacing in some series (or at the start of a series) don't change it
+
+    Arguments:
+        times {np array} -- (N,) numeric times, in any order
+
+    Keyword Arguments:
+        series {np array} -- (N,) integer code of the series of each time, all times belong to 
+            the same series if None (default: {None})
+
+    Returns:
+        int or float -- most common difference (the smallest one on ties), None if no series has 
+            two distinct times
+    """
+
+    return most_common_step(*time_step_counts(times, series))
+
+
+def grid_positions(times, grid_ids, grids):
+    """ maps observation times to the position of the nearest time of their grid (the later one 
+        on ties), for all grids at once: observations and grid times are merged in a single sort 
+        by (grid, time)
+
+    Arguments:
+        times {np array} -- (N,) int64 observation times
+        grid_ids {np array} -- (N,) index of the grid of each observation
+        grids {Sequence[np array]} -- non-empty, sorted int64 grid times
+
+    Returns:
+        np array -- (N,) int64 position of each observation in its grid
+    """
+
+    times = np.asarray(times, dtype=np.int64)
+    grid_ids = np.asarray(grid_ids, dtype=np.int64)
+    lengths = np.array([len(grid) for grid in grids], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    grid_times = np.concatenate(grids).astype(np.int64)
+
+    # stable sort, so grid times come before observations at the same time
+    order = np.lexsort(
+        (
+            np.concatenate((grid_times, times)),
+            np.concatenate((np.repeat(np.arange(len(grids)), lengths), grid_ids)),
+        )
+    )
+    is_grid = order < len(grid_times)
+    following = np.empty(len(times), dtype=np.int64)
+    following[order[~is_grid] - len(grid_times)] = np.cumsum(is_grid)[~is_grid]
+
+    # first grid time after and last grid time at or before each observation
+    following -= starts[grid_ids]
+    preceding = following - 1
+    length = lengths[grid_ids]
+    to_preceding = times - grid_times[starts[grid_ids] + np.maximum(preceding, 0)]
+    to_following = grid_times[starts[grid_ids] + np.minimum(following, length - 1)] - times
+    return np.where(
+        (preceding < 0) | ((following < length) & (to_following <= to_preceding)),
+        following,
+        preceding,
+    )
+
+
+def grid_average(positions, series, values, n_positions, n_series):
+    """ averages the observations of many series that fall on the same grid position
+
+    Arguments:
+        positions {np array} -- (N,) grid position of each observation
+        series {np array} -- (N,) index of the series of each observation
+        values {np array} -- (N, C) observed values, missing values are ignored
+        n_positions {int} -- number of grid positions
+        n_series {int} -- number of series
+
+    Returns:
+        np array -- (n_positions, n_series * C) average values, series side by side, NaN where 
+            a series has no observation
+    """
+
+    values = np.asarray(values, dtype=np.float64).reshape(len(positions), -1)
+    n_columns = values.shape[1]
+    cells = (
+        (np.asarray(positions) * n_series + np.asarray(series))[:, np.newaxis] * n_columns
+        + np.arange(n_columns)
+    ).ravel()
+    observed = ~np.isnan(values.ravel())
+    size = n_positions * n_series * n_columns
+    sums = np.bincount(cells[observed], weights=values.ravel()[observed], minlength=size)
+    counts = np.bincount(cells[observed], minlength=size)
+    with np.errstate(invalid="ignore"):
+        return (sums / counts).reshape(n_positions, n_series * n_columns)
+
+
+def interpolate_columns(values, x):
+    """ linearly interpolates the missing values of every column of a 2-D array in one pass, 
+        extending the first and last observation of each column to its ends (like pandas 
+        interpolate with limit_direction='both'). Columns without observations stay missing
+
+    Arguments:
+        values {np array} -- (n, m) values with missing values as NaN
+        x {np array} -- (n,) or (n, m) coordinates (e.g. int64 times) of the rows
+
+    Returns:
+        np array -- (n, m) interpolated values
+    """
+
+    n, m = values.shape
+    x = np.broadcast_to(np.asarray(x).reshape(n, -1), (n, m))
+    observed = ~np.isnan(values)
+
+    # previous and next observed row of each row
+    rows = np.arange(n)[:, np.newaxis]
+    preceding = np.maximum.accumulate(np.where(observed, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(observed, rows, n)[::-1], axis=0)[::-1]
+    preceding = np.where(preceding < 0, following, preceding)
+    following = np.where(following == n, preceding, following)
+    empty = preceding == n
+    preceding[empty] = following[empty] = 0
+
+    columns = np.arange(m)
+    y0, y1 = values[preceding, columns], values[following, columns]
+    x0, x1 = x[preceding, columns], x[following, columns]
+    span = x1 - x0
+    weight = np.where(span != 0, (x - x0) / np.where(span != 0, span, 1), 0)
+    interpolated = y0 + weight * (y1 - y0)
+    interpolated[empty] = np.nan
+    return interpolated
+
+
+def regularize(times, series, values, grids, series_grid):
+    """ maps irregular observations of many series onto regular time grids and linearly 
+        interpolates the grid positions without observations, for all series at once: 
+        observations are averaged on the nearest grid position of their series' grid and gaps 
+        are interpolated over one (time x series) array
+
+    Arguments:
+        times {np array} -- (N,) int64 observation times
+        series {np array} -- (N,) index of the series of each observation
+        values {np array} -- (N, C) observed values
+        grids {Sequence[np array]} -- non-empty, sorted int64 grid times
+        series_grid {np array} -- (S,) index of the grid of each series
+
+    Returns:
+        np array -- (max grid length, S, C) values on the grids, a series' values after the 
+            end of its grid are extended from its last grid value
+    """
+
+    series = np.asarray(series, dtype=np.int64)
+    series_grid = np.asarray(series_grid, dtype=np.int64)
+    positions = grid_positions(times, series_grid[series], grids)
+
+    # grid times side by side, shorter grids padded with their last time
+    length = max(len(grid) for grid in grids)
+    grid_times = np.empty((length, len(grids)), dtype=np.int64)
+    for i, grid in enumerate(grids):
+        grid_times[: len(grid), i] = grid
+        grid_times[len(grid) :, i] = grid[-1]
+
+    n_columns = np.shape(values)[1]
+    averages = grid_average(positions, series, values, length, len(series_grid))
+    interpolated = interpolate_columns(
+        averages, grid_times[:, np.repeat(series_grid, n_columns)]
+    )
+    return interpolated.reshape(length, len(series_grid), n_columns)
@@ -1,15 +1,44 @@
-from pmdarima.arima import auto_arima
+from pmdarima.arima import ARIMA, auto_arima, ndiffs, nsdiffs
+from pmdarima.utils import diff
+from statsmodels.tsa.api import VAR as vector_ar
+from statsmodels.tsa.vector_ar import util as var_util
+from statsmodels.tsa.vector_ar.var_model import VARResults, VARResultsWrapper
+from sklearn.linear_model import Lasso
 import pandas as pd
 import numpy as np
+import scipy.stats as stats
+import os
+import hashlib
+import json
+import tempfile
+import weakref
+import collections
+import itertools
+import time
+import zipfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# order fit by the 'fixed' ARIMA search, the starting point of auto_arima's stepwise search
+DEFAULT_ARIMA_ORDER = (1, 0, 1)
+
+# name of the JSON metadata of a fit cache entry persisted alongside its arrays
+FIT_CACHE_METADATA = "metadata"
+
 
 class Arima:
     def __init__(
-        self, seasonal=True, seasonal_differencing=1, max_order=5, dynamic=True
+        self,
+        seasonal=True,
+        seasonal_differencing=1,
+        max_order=5,
+        dynamic=True,
+        search="stepwise",
+        max_fits=None,
+        n_threads=1,
     ):
         """initialize ARIMA class
         
@@ -18,12 +47,21 @@ class Arima:
             seasonal_differencing {int} -- period for seasonal differencing (default: {1})
             max_order {int} -- maximum order of p and q terms on which to fit model (default: {5})
             dynamic {bool} -- whether in-sample lagged values should be used for in-sample prediction
+            search {str} -- order search, 'stepwise' (pmdarima auto_arima), 'grid' or 'fixed'
+                (DEFAULT_ARIMA_ORDER, no search) (default: {'stepwise'})
+            max_fits {int} -- maximum number of candidate models fit by the grid search, 
+                None for no limit (default: {None})
+            n_threads {int} -- number of threads fitting candidate models of the grid search 
+                (default: {1})
         """
 
         self.seasonal = seasonal
         self.seasonal_differencing = seasonal_differencing
         self.max_order = max_order
         self.dynamic = dynamic
+        self.search = search
+        self.max_fits = max_fits
+        self.n_threads = n_threads
 
     def _transform(self, input):
         """ transforms data according to defined transformation 
@@ -57,20 +95,107 @@ class Arima:
         """
 
         self.min_train = min(train)
-        self.arima_model = auto_arima(
-            train,
-            # self._transform(train),
-            start_p=1,
-            start_q=1,
-            max_p=self.max_order,
-            max_q=self.max_order,
-            m=self.seasonal_differencing,
-            seasonal=self.seasonal,
-            stepwise=True,
-            suppress_warnings=True,
+        start = time.time()
+        if self.search == "grid":
+            self.arima_model = self._grid_search(train)
+        elif self.search == "fixed":
+            self.n_fits = 1
+            self.arima_model = ARIMA(DEFAULT_ARIMA_ORDER, suppress_warnings=True).fit(train)
+        else:
+            self.arima_model = None
+        if self.arima_model is None:
+            # auto_arima returns the selected model already fit on train, after an unknown 
+            # number of stepwise fits
+            self.n_fits = None
+            self.arima_model = auto_arima(
+                train,
+                # self._transform(train),
+                start_p=1,
+                start_q=1,
+                max_p=self.max_order,
+                max_q=self.max_order,
+                m=self.seasonal_differencing,
+                seasonal=self.seasonal,
+                stepwise=True,
+                suppress_warnings=True,
+            )
+        self.fit_time = time.time() - start
+        logger.info(
+            f"Fit ARIMA{self.arima_model.order}x{self.arima_model.seasonal_order} on "
+            + f"{len(train)} observations in {self.fit_time:.2f}s ({self.search} search)"
+        )
+
+    def _grid_search(self, train):
+        """ fits candidate orders up to max_order and keeps the model with the lowest AIC. 
+            Differencing orders are tested once and shared by all candidates, and candidates 
+            are fit in order of increasing complexity so that max_fits drops the most 
+            expensive ones
+        
+        Arguments:
+            train {np array} -- endogenous time series
+
+        Returns:
+            pmdarima ARIMA -- best fit model, None if no candidate could be fit
+        """
+
+        m = self.seasonal_differencing
+        seasonal = self.seasonal and m > 1
+        values = np.asarray(train, dtype=np.float64)
+        D = nsdiffs(values, m=m, max_D=1) if seasonal else 0
+        d = ndiffs(diff(values, lag=m, differences=D) if D else values, max_d=2)
+
+        candidates = [
+            (p, q, P, Q)
+            for p, q in itertools.product(range(self.max_order + 1), repeat=2)
+            for P, Q in itertools.product(range(2 if seasonal else 1), repeat=2)
+            if p + q + P + Q <= self.max_order
+        ]
+        candidates.sort(key=sum)
+        if self.max_fits is not None:
+            candidates = candidates[: self.max_fits]
+        self.n_fits = len(candidates)
+
+        def fit_candidate(candidate):
+            p, q, P, Q = candidate
+            kwargs = {"seasonal_order": (P, D, Q, m)} if seasonal else {}
+            model = ARIMA(
+                (p, d, q), suppress_warnings=True, with_intercept=d + D < 2, **kwargs
+            )
+            try:
+                return model.fit(train)
+            except (ValueError, np.linalg.LinAlgError) as e:
+                logger.debug(f"Could not fit ARIMA{model.order}: {e}")
+                return None
+
+        if self.n_threads > 1:
+            with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+                models = list(executor.map(fit_candidate, candidates))
+        else:
+            models = [fit_candidate(candidate) for candidate in candidates]
+
+        models = [model for model in models if model is not None and np.isfinite(model.aic())]
+        if not len(models):
+            logger.debug("No ARIMA candidate could be fit, falling back to stepwise search")
+            return None
+        return min(models, key=lambda model: model.aic())
+
+    def update(self, observations):
+        """ extends the fit model with observations that follow the training series, keeping the 
+            selected order (no order search)
+        
+        Arguments:
+            observations {np array} -- new values of the endogenous time series
+        """
+
+        start = time.time()
+        if hasattr(self.arima_model, "update"):
+            self.arima_model.update(observations)
+        else:
+            self.arima_model.add_new_observations(observations)
+        logger.debug(
+            f"Updated ARIMA{self.arima_model.order} with {len(observations)} observations "
+            + f"in {time.time() - start:.2f}s"
         )
-        # self.arima_model.fit(self._transform(train))
-        self.arima_model.fit(train)
 
     def predict(self, n_periods=1, return_conf_int=False, alpha=0.05):
         """forecasts the time series n_periods into the future
@@ -142,3 +267,912 @@ class Arima:
             np.absolute(self.arima_model.params().reshape(1, -1)),
             columns=trend_cols + ar_cols + ma_cols,
         )
+
+
+class TrainingBlock:
+    def __init__(self, n_groups):
+        """ preallocated (time x series) block that collects the reindexed groups of one 
+            top-level grouping key, so that the training DataFrame is built in a single allocation
+            instead of growing it with one concatenation per group
+
+        Arguments:
+            n_groups {int} -- number of groups that will be added to the block
+        """
+
+        self.n_groups = n_groups
+        self.index = None
+        self.values = None
+        self.columns = []
+        self._offset = 0
+
+    def add(self, group):
+        """ copies the values of a group into the next free columns of the block
+
+        Arguments:
+            group {pandas df} -- group reindexed to the interpolation range of its top-level grouping key
+        """
+
+        values = group.values
+        width = values.shape[1]
+        if self.values is None:
+            self.index = group.index
+            self.values = np.empty(
+                (values.shape[0], self.n_groups * width), dtype=values.dtype
+            )
+        elif not np.can_cast(values.dtype, self.values.dtype):
+            self.values = self.values.astype(np.result_type(values.dtype, self.values.dtype))
+
+        # groups are expected to share the same columns, grow the block if they don't
+        if self._offset + width > self.values.shape[1]:
+            extra = np.empty(
+                (self.values.shape[0], self._offset + width - self.values.shape[1]),
+                dtype=self.values.dtype,
+            )
+            self.values = np.concatenate((self.values, extra), axis=1)
+
+        self.values[:, self._offset : self._offset + width] = values
+        self.columns.extend(group.columns)
+        self._offset += width
+
+    def reorder(self, order):
+        """ permutes the groups of the block, which must all have the same columns
+
+        Arguments:
+            order {Sequence[int]} -- insertion index of the group to put at each position
+        """
+
+        width = self._offset // len(order)
+        cols = np.concatenate([np.arange(i * width, (i + 1) * width) for i in order])
+        self.values = self.values[:, cols]
+        self.columns = [self.columns[col] for col in cols]
+
+    def to_frame(self):
+        """ materializes the block as a DataFrame (no copy of the block values)
+        
+        Returns:
+            pandas df -- df with one column per series, indexed by time
+        """
+
+        return pd.DataFrame(
+            self.values[:, : self._offset], index=self.index, columns=self.columns
+        )
+
+
+class ValueArena:
+    def __init__(self, shapes, directory=None):
+        """ single memory-mapped .npy file (arena) holding the float64 arrays of many regressions 
+            back to back, with an offset table. Arrays are paged in from disk when read instead 
+            of being resident in memory. The file is removed once the arena is garbage collected
+
+        Arguments:
+            shapes {Sequence[tuple]} -- shape of each array
+
+        Keyword Arguments:
+            directory {str} -- directory in which to create the arena, the default temporary 
+                directory if None (default: {None})
+        """
+
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.offsets = np.cumsum([0] + [int(np.prod(shape)) for shape in self.shapes])
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".npy", dir=directory)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+        self.data = np.lib.format.open_memmap(
+            self.path, mode="w+", dtype=np.float64, shape=(max(int(self.offsets[-1]), 1),)
+        )
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, i):
+        """ view of the i-th array in the arena
+        
+        Arguments:
+            i {int} -- index of the array
+
+        Returns:
+            np array -- memory-mapped array
+        """
+
+        return self.data[self.offsets[i] : self.offsets[i + 1]].reshape(self.shapes[i])
+
+    def freeze(self):
+        """ flushes the arena to disk and maps it again read-only, so that its pages are clean 
+            and can be dropped from memory without being written back
+        """
+
+        self.data.flush()
+        self.data = np.load(self.path, mmap_mode="r")
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.debug(f"Could not remove {path}: {e}")
+
+
+def export_var_fit(fit):
+    """ extracts the state of a fit statsmodels VAR that is needed to forecast as plain arrays
+    
+    Arguments:
+        fit {VARResults} -- fit statsmodels VAR results
+
+    Returns:
+        dict -- lag order ('k_ar'), (1 + K * k_ar, K) coefficients ('params') and (K, K) 
+            residual covariance ('sigma_u')
+    """
+
+    return {
+        "k_ar": int(fit.k_ar),
+        "params": np.asarray(fit.params),
+        "sigma_u": np.asarray(fit.sigma_u),
+    }
+
+
+def restore_var_fit(state, endog, dates=None):
+    """ rebuilds statsmodels VAR results from the arrays saved by export_var_fit, without
+        re-running order selection or estimation
+    
+    Arguments:
+        state {dict} -- output of export_var_fit
+        endog {np array} -- (T, K) endogenous (differenced) series the VAR was fit on
+
+    Keyword Arguments:
+        dates {pd DatetimeIndex} -- dates of the series (default: {None})
+
+    Returns:
+        VARResultsWrapper -- same results object that VAR.fit would have returned
+    """
+
+    model = vector_ar(endog, dates=dates)
+    k_ar = state["k_ar"]
+    endog_lagged = var_util.get_var_endog(endog, k_ar, trend="c", has_constant="raise")
+    results = VARResults(
+        endog,
+        endog_lagged,
+        state["params"],
+        state["sigma_u"],
+        k_ar,
+        model=model,
+        trend="c",
+        names=model.endog_names,
+        dates=model.data.dates,
+    )
+    return VARResultsWrapper(results)
+
+
+def var_design(endog, lags):
+    """ builds the lagged design matrix of a VAR with a constant, laid out like statsmodels:
+        row t is [1, y_{t-1}, ..., y_{t-lags}]
+    
+    Arguments:
+        endog {np array} -- (..., T, K) endogenous series, optionally stacked along leading axes
+        lags {int} -- number of lags
+
+    Returns:
+        np array -- (..., T - lags, 1 + K * lags) design matrix
+    """
+
+    n_obs, k = endog.shape[-2:]
+    design = np.empty(endog.shape[:-2] + (n_obs - lags, 1 + k * lags), dtype=np.float64)
+    design[..., 0] = 1
+    for lag in range(1, lags + 1):
+        design[..., 1 + (lag - 1) * k : 1 + lag * k] = endog[..., lags - lag : n_obs - lag, :]
+    return design
+
+
+def lag_windows(endog, lags):
+    """ zero-copy view of the lagged values of a VAR (a read-only stride trick, like 
+        sliding_window_view with reversed windows): element [..., t, l] is y_{t + lags - 1 - l}, 
+        i.e. the value l + 1 steps before the t-th observation of the sample
+    
+    Arguments:
+        endog {np array} -- (..., T, K) endogenous series, optionally stacked along leading axes
+        lags {int} -- number of lags
+
+    Returns:
+        np array -- (..., T - lags, lags, K) read-only view of endog
+    """
+
+    n_obs, k = endog.shape[-2:]
+    row_stride = endog.strides[-2]
+    return np.lib.stride_tricks.as_strided(
+        endog[..., max(lags - 1, 0) :, :],
+        shape=endog.shape[:-2] + (n_obs - lags, lags, k),
+        strides=endog.strides[:-2] + (row_stride, -row_stride, endog.strides[-1]),
+        writeable=False,
+    )
+
+
+def lagged_gram(endog, lags):
+    """ Gram matrix of the lagged design matrix and the sample of a VAR with a constant, i.e. of 
+        [1, y_{t-1}, ..., y_{t-lags}, y_t] over t = lags, ..., T - 1, without building the design 
+        matrix. Block (a, b) = sum_t y_{t-a} y_{t-b}' is the full-range cross product of lag b - a 
+        minus the few rows outside the sample, so the cost is O(lags T K^2 + lags^3 K^2) instead 
+        of O(lags^2 T K^2), and memory is O(T K)
+    
+    Arguments:
+        endog {np array} -- (..., T, K) endogenous series, optionally stacked along leading axes
+        lags {int} -- number of lags
+
+    Returns:
+        np array -- (..., 1 + K * (lags + 1), 1 + K * (lags + 1)) Gram matrix. Z'Z is the leading 
+            (1 + K * lags) block, Z'Y and Y'Y are the last K columns
+    """
+
+    endog = np.asarray(endog, dtype=np.float64)
+    n_obs, k = endog.shape[-2:]
+    size = 1 + k * (lags + 1)
+    gram = np.empty(endog.shape[:-2] + (size, size))
+
+    def cols(lag):
+        start = 1 + k * (lag - 1) if lag else 1 + k * lags
+        return slice(start, start + k)
+
+    # constant
+    cumsum = np.cumsum(endog, axis=-2)
+    cumsum = np.concatenate((np.zeros_like(cumsum[..., :1, :]), cumsum), axis=-2)
+    gram[..., 0, 0] = n_obs - lags
+    for lag in range(lags + 1):
+        gram[..., 0, cols(lag)] = cumsum[..., n_obs - lag, :] - cumsum[..., lags - lag, :]
+        gram[..., cols(lag), 0] = gram[..., 0, cols(lag)]
+
+    # sample s = t - b of block (a, b) runs over lags - b, ..., T - 1 - b: remove the first lags - b 
+    # and the last a rows of the full-range cross product sum_s y_{s+d} y_s'
+    for d in range(lags + 1):
+        full = endog[..., d:, :].swapaxes(-1, -2) @ endog[..., : n_obs - d, :]
+        for a in range(lags + 1 - d):
+            b = a + d
+            head = (
+                endog[..., d : d + lags - b, :].swapaxes(-1, -2) @ endog[..., : lags - b, :]
+            )
+            tail = (
+                endog[..., n_obs - a :, :].swapaxes(-1, -2)
+                @ endog[..., n_obs - b : n_obs - d, :]
+            )
+            block = full - head - tail
+            gram[..., cols(a), cols(b)] = block
+            gram[..., cols(b), cols(a)] = block.swapaxes(-1, -2)
+    return gram
+
+
+def var_predict(endog, params, lags):
+    """ one-step-ahead predictions of a VAR with a constant over the sample t = lags, ..., T - 1, 
+        i.e. var_design(endog, lags) @ params, computed from lag windows without building the 
+        design matrix
+    
+    Arguments:
+        endog {np array} -- (T, K) endogenous series
+        params {np array} -- (1 + K * lags, K) coefficients
+        lags {int} -- lag order
+
+    Returns:
+        np array -- (T - lags, K) predictions
+    """
+
+    k = endog.shape[-1]
+    windows = lag_windows(endog, lags)
+    predictions = np.repeat(params[:1], windows.shape[0], axis=0)
+    for lag in range(lags):
+        predictions += windows[:, lag] @ params[1 + lag * k : 1 + (lag + 1) * k]
+    return predictions
+
+
+# lag windows whose Cholesky factor has a smaller diagonal ratio are handled by QR, the Gram matrix 
+# squares the condition number of the design matrix
+GRAM_CONDITION_TOLERANCE = 1e-6
+
+
+def _logdet(matrix):
+    """ log determinant of a symmetric positive definite matrix, raises np.linalg.LinAlgError
+        if the matrix is not positive definite (same as statsmodels' logdet_symm)
+    """
+    return 2 * np.sum(np.log(np.diagonal(np.linalg.cholesky(matrix))))
+
+
+def select_var_order(endog, maxlags=None):
+    """ selects the lag order of a VAR with a constant by AIC, equivalent to statsmodels' 
+        VAR.select_order(maxlags).aic. All candidate orders are estimated on the same sample, 
+        so their design matrices are nested column blocks of the largest one: a single Cholesky 
+        decomposition of the lagged Gram matrix gives the residual covariances of every order, 
+        without building the design matrix
+    
+    Arguments:
+        endog {np array} -- (T, K) endogenous series
+
+    Keyword Arguments:
+        maxlags {int} -- largest lag order to consider, if None 12 * (T / 100)^(1/4) 
+            (default: {None})
+
+    Raises:
+        ValueError: if maxlags is too large for the number of observations
+        np.linalg.LinAlgError: if a residual covariance matrix is not positive definite
+
+    Returns:
+        int -- lag order with the lowest AIC
+    """
+
+    endog = np.asarray(endog, dtype=np.float64)
+    n_totobs, k = endog.shape
+    maxlags = _default_maxlags(n_totobs, k, maxlags)
+    nobs = n_totobs - maxlags
+
+    # the upper Cholesky factor of the Gram matrix of [Z, Y] is the R of its QR decomposition: 
+    # the rows after the columns of an order give the residual cross products of that order
+    try:
+        r = np.linalg.cholesky(lagged_gram(endog, maxlags)).T
+        r_diag = np.diagonal(r)[:-k]
+        well_conditioned = r_diag.min() > r_diag.max() * GRAM_CONDITION_TOLERANCE
+    except np.linalg.LinAlgError:
+        well_conditioned = False
+    if not well_conditioned:
+        return _select_var_order_qr(endog, maxlags)
+
+    aics = []
+    for lags in range(maxlags + 1):
+        n_cols = 1 + k * lags
+        resid_r = r[n_cols:, -k:]
+        aics.append(
+            _logdet(resid_r.T @ resid_r / nobs) + (2.0 / nobs) * (lags * k ** 2 + k)
+        )
+
+    return int(np.argmin(aics))
+
+
+def _select_var_order_qr(endog, maxlags):
+    """ select_var_order from the QR decomposition of the full design matrix, for ill-conditioned 
+        or rank deficient lags whose Gram matrix cannot be factorized accurately
+    
+    Arguments:
+        endog {np array} -- (T, K) endogenous series
+        maxlags {int} -- largest lag order to consider
+
+    Raises:
+        np.linalg.LinAlgError: if a residual covariance matrix is not positive definite
+
+    Returns:
+        int -- lag order with the lowest AIC
+    """
+
+    k = endog.shape[1]
+    design = var_design(endog, maxlags)
+    y_sample = endog[maxlags:]
+    nobs = y_sample.shape[0]
+
+    q, r = np.linalg.qr(design)
+    r_diag = np.abs(np.diagonal(r))
+    full_rank = r_diag.min() > r_diag.max() * max(design.shape) * np.finfo(np.float64).eps
+    if full_rank:
+        projections = q.T @ y_sample
+
+    aics = []
+    resid = y_sample
+    for lags in range(maxlags + 1):
+        n_cols = 1 + k * lags
+        if not full_rank:
+            # redundant columns, solve each order separately like statsmodels
+            params = np.linalg.lstsq(design[:, :n_cols], y_sample, rcond=1e-15)[0]
+            resid = y_sample - design[:, :n_cols] @ params
+        elif lags == 0:
+            resid = y_sample - q[:, :1] @ projections[:1]
+        else:
+            block = slice(n_cols - k, n_cols)
+            resid = resid - q[:, block] @ projections[block]
+
+        if nobs - n_cols:
+            logdet = _logdet(resid.T @ resid / nobs)
+        else:
+            logdet = -np.inf
+        aics.append(logdet + (2.0 / nobs) * (lags * k ** 2 + k))
+
+    return int(np.argmin(aics))
+
+
+def _default_maxlags(n_totobs, k, maxlags=None):
+    """ validates maxlags, or derives it from the number of observations like statsmodels
+    
+    Arguments:
+        n_totobs {int} -- number of observations
+        k {int} -- number of equations
+
+    Keyword Arguments:
+        maxlags {int} -- largest lag order to consider (default: {None})
+
+    Raises:
+        ValueError: if maxlags is too large for the number of observations
+
+    Returns:
+        int -- largest lag order to consider
+    """
+
+    max_estimable = (n_totobs - k - 1) // (1 + k)
+    if maxlags is None:
+        return min(int(round(12 * (n_totobs / 100.0) ** (1 / 4.0))), max_estimable)
+    elif maxlags > max_estimable:
+        raise ValueError(
+            "maxlags is too large for the number of observations and "
+            "the number of equations. The largest model cannot be estimated."
+        )
+    return maxlags
+
+
+def fit_var_batch(endogs, maxlags=None, max_condition=1e8):
+    """ selects lag orders by AIC and fits VARs with a constant for a batch of series of 
+        identical shape, solving the stacked normal equations of all series at once
+    
+    Arguments:
+        endogs {np array} -- (B, T, K) endogenous series
+
+    Keyword Arguments:
+        maxlags {int} -- largest lag order to consider, if None 12 * (T / 100)^(1/4) 
+            (default: {None})
+        max_condition {float} -- series whose Gram matrix has a larger condition number are 
+            not solved in the batch (default: {1e8})
+
+    Raises:
+        ValueError: if maxlags is too large for the number of observations
+
+    Returns:
+        list[tuple(int, VARFit) or None] -- lag order and fit VAR of each series, None for ill-
+            conditioned series that should be fit individually
+    """
+
+    endogs = np.asarray(endogs, dtype=np.float64)
+    n_series, n_totobs, k = endogs.shape
+    maxlags = _default_maxlags(n_totobs, k, maxlags)
+
+    # order selection: every candidate order is estimated on the same sample
+    nobs = n_totobs - maxlags
+    gram = lagged_gram(endogs, maxlags)
+    cross, y_gram, gram = gram[:, :-k, -k:], gram[:, -k:, -k:], gram[:, :-k, :-k]
+    eigenvalues = np.linalg.eigvalsh(gram)
+    valid = eigenvalues[:, 0] * max_condition > eigenvalues[:, -1]
+
+    aics = np.empty((maxlags + 1, n_series))
+    for lags in range(maxlags + 1):
+        n_cols = 1 + k * lags
+        params = np.linalg.solve(gram[valid, :n_cols, :n_cols], cross[valid, :n_cols])
+        ssr = y_gram[valid] - cross[valid, :n_cols].swapaxes(1, 2) @ params
+        if nobs - n_cols:
+            sign, logdet = np.linalg.slogdet((ssr + ssr.swapaxes(1, 2)) / (2 * nobs))
+            # non positive definite residual covariances are left to the single series path
+            valid[valid] = sign > 0
+            logdet = logdet[sign > 0]
+        else:
+            logdet = -np.inf
+        aics[lags, valid] = logdet + (2.0 / nobs) * (lags * k ** 2 + k)
+    selected = np.argmin(aics, axis=0)
+
+    # estimation on the full sample, batched by selected order
+    results = [None for i in range(n_series)]
+    for lags in np.unique(selected[valid]):
+        idxs = np.flatnonzero(valid & (selected == lags))
+        gram = lagged_gram(endogs[idxs], lags)
+        params = np.linalg.solve(gram[:, :-k, :-k], gram[:, :-k, -k:])
+        for idx, series_params in zip(idxs, params):
+            results[idx] = (int(lags), VARFit(endogs[idx], int(lags), params=series_params))
+    return results
+
+
+def fit_penalized_var(endog, lags, estimator="ridge", penalty=0.1):
+    """ VAR with a constant, fit by penalized least squares on standardized lagged values. Unlike 
+        least squares, it can be fit with more coefficients than observations (many series)
+        
+        'ridge' minimizes ||e||^2 / n + penalty * ||B||^2 in closed form, solving the n x n dual 
+        system if there are more coefficients than observations. 'lasso' minimizes 
+        ||e||^2 / (2 * n) + penalty * |B|_1 by (scikit-learn's) coordinate descent, which sets 
+        coefficients of uninformative lags to zero. The constant is not penalized
+    
+    Arguments:
+        endog {np array} -- (T, K) endogenous series
+        lags {int} -- lag order (> 0)
+
+    Keyword Arguments:
+        estimator {str} -- 'ridge' or 'lasso' (default: {"ridge"})
+        penalty {float} -- penalty weight (default: {0.1})
+
+    Returns:
+        VARFit -- fit model, with residual covariance divided by the number of observations
+    """
+
+    endog = np.asarray(endog, dtype=np.float64)
+    design = var_design(endog, lags)[:, 1:]
+    y_sample = endog[lags:]
+    nobs = y_sample.shape[0]
+
+    # center and standardize lagged values, constant lagged values get zero coefficients
+    x_mean, y_mean = design.mean(axis=0), y_sample.mean(axis=0)
+    x_scale = design.std(axis=0)
+    x_scale[x_scale == 0] = np.inf
+    x = (design - x_mean) / x_scale
+    y = y_sample - y_mean
+
+    if estimator == "lasso":
+        coefs = Lasso(alpha=penalty, fit_intercept=False).fit(x, y).coef_.T
+    elif x.shape[1] > nobs:
+        coefs = x.T @ np.linalg.solve(x @ x.T + nobs * penalty * np.eye(nobs), y)
+    else:
+        coefs = np.linalg.solve(x.T @ x + nobs * penalty * np.eye(x.shape[1]), x.T @ y)
+
+    # undo standardization
+    coefs = coefs / x_scale[:, np.newaxis]
+    params = np.vstack((y_mean - x_mean @ coefs, coefs))
+    resid = y_sample - params[0] - design @ coefs
+    return VARFit(endog, lags, params=params, sigma_u=resid.T @ resid / nobs)
+
+
+class VARStatistics:
+    def __init__(self, endog, k_ar):
+        """ least squares sufficient statistics (Z'Z, Z'Y, Y'Y) of a VAR with a constant, which can 
+            be extended with new observations without revisiting the full sample
+        
+        Arguments:
+            endog {np array} -- (T, K) endogenous series
+            k_ar {int} -- lag order
+        """
+
+        self.k_ar = k_ar
+        self.nobs = 0
+        n_cols = 1 + endog.shape[1] * k_ar
+        self.gram = np.zeros((n_cols, n_cols))
+        self.cross = np.zeros((n_cols, endog.shape[1]))
+        self.y_gram = np.zeros((endog.shape[1], endog.shape[1]))
+        self.add(endog, endog.shape[0] - k_ar)
+
+    def add(self, endog, n_new):
+        """ adds the last n_new observations of endog, each one an O(K^2 k_ar^2) rank one update
+        
+        Arguments:
+            endog {np array} -- (T, K) endogenous series, including the new observations
+            n_new {int} -- number of new observations at the end of endog
+        """
+
+        k = endog.shape[1]
+        gram = lagged_gram(endog[endog.shape[0] - n_new - self.k_ar :], self.k_ar)
+        self.gram += gram[:-k, :-k]
+        self.cross += gram[:-k, -k:]
+        self.y_gram += gram[-k:, -k:]
+        self.nobs += n_new
+
+    def solve(self):
+        """ least squares estimates from the sufficient statistics
+        
+        Raises:
+            np.linalg.LinAlgError: if Z'Z is singular
+
+        Returns:
+            tuple(np array) -- (1 + K * k_ar, K) params and (K, K) residual covariance
+        """
+
+        params = np.linalg.solve(self.gram, self.cross)
+        df_resid = self.nobs - self.gram.shape[0]
+        if df_resid > 0:
+            ssr = self.y_gram - self.cross.T @ params
+            sigma_u = (ssr + ssr.T) / (2 * df_resid)
+        else:
+            sigma_u = np.full(self.y_gram.shape, np.nan)
+        return params, sigma_u
+
+
+class VARFit:
+    def __init__(self, endog, k_ar, params=None, sigma_u=None):
+        """ closed-form VAR with a constant, fit by least squares. Exposes the subset of 
+            statsmodels' VARResults that the VAR primitive uses
+        
+        Arguments:
+            endog {np array} -- (T, K) endogenous series
+            k_ar {int} -- lag order
+
+        Keyword Arguments:
+            params {np array} -- (1 + K * k_ar, K) coefficients, estimated if None (default: {None})
+            sigma_u {np array} -- (K, K) residual covariance, estimated if None (default: {None})
+        """
+
+        endog = np.asarray(endog, dtype=np.float64)
+        self.k_ar = k_ar
+        self.neqs = endog.shape[1]
+        self._endog = endog
+        y_sample = endog[k_ar:]
+        self.nobs = y_sample.shape[0]
+        self.df_model = 1 + self.neqs * k_ar
+
+        if params is None:
+            params = np.linalg.lstsq(var_design(endog, k_ar), y_sample, rcond=1e-15)[0]
+        self.params = params
+        self.fittedvalues = var_predict(endog, params, k_ar)
+
+        if sigma_u is None:
+            resid = y_sample - self.fittedvalues
+            df_resid = self.nobs - self.df_model
+            if df_resid:
+                sigma_u = resid.T @ resid / df_resid
+            else:
+                sigma_u = np.full((self.neqs, self.neqs), np.nan)
+        self.sigma_u = sigma_u
+
+    @property
+    def coefs(self):
+        """ np array -- (k_ar, K, K) coefficient matrices of each lag """
+        return self.params[1:].reshape((self.k_ar, self.neqs, self.neqs)).swapaxes(1, 2)
+
+    @property
+    def stderr(self):
+        """ np array -- (1 + K * k_ar, K) standard errors of params """
+        gram_inv = np.linalg.inv(lagged_gram(self._endog, self.k_ar)[: -self.neqs, : -self.neqs])
+        return np.sqrt(np.outer(np.diagonal(gram_inv), np.diagonal(self.sigma_u)))
+
+    def forecast(self, y, steps):
+        """ forecasts by iterating the VAR recursion from the last k_ar observations
+        
+        Arguments:
+            y {np array} -- (>= k_ar, K) observations preceding the forecast
+            steps {int} -- number of steps to forecast
+
+        Returns:
+            np array -- (steps, K) forecasts
+        """
+
+        history = np.empty((self.k_ar + steps, self.neqs))
+        history[: self.k_ar] = np.asarray(y)[len(y) - self.k_ar :]
+        intercept, coefs = self.params[0], self.params[1:]
+        for step in range(steps):
+            lagged = history[step : step + self.k_ar][::-1].ravel()
+            history[self.k_ar + step] = intercept + lagged @ coefs
+        return history[self.k_ar :]
+
+    def ma_rep(self, maxn=10):
+        """ MA(infinity) coefficient matrices
+        
+        Keyword Arguments:
+            maxn {int} -- number of coefficient matrices to compute (default: {10})
+
+        Returns:
+            np array -- (maxn + 1, K, K) coefficient matrices
+        """
+
+        coefs = self.coefs
+        phis = np.zeros((maxn + 1, self.neqs, self.neqs))
+        phis[0] = np.eye(self.neqs)
+        for i in range(1, maxn + 1):
+            for j in range(1, min(i, self.k_ar) + 1):
+                phis[i] += phis[i - j] @ coefs[j - 1]
+        return phis
+
+    def mse(self, steps):
+        """ forecast error covariance matrices, ignoring parameter uncertainty
+        
+        Arguments:
+            steps {int} -- number of steps
+
+        Returns:
+            np array -- (steps, K, K) covariance matrices
+        """
+
+        phis = self.ma_rep(steps)[:steps]
+        return np.cumsum(phis @ self.sigma_u @ phis.swapaxes(1, 2), axis=0)
+
+    def forecast_interval(self, y, steps, alpha=0.05):
+        """ forecasts with gaussian confidence intervals
+        
+        Arguments:
+            y {np array} -- (>= k_ar, K) observations preceding the forecast
+            steps {int} -- number of steps to forecast
+
+        Keyword Arguments:
+            alpha {float} -- significance level of the intervals (default: {0.05})
+
+        Returns:
+            tuple(np array) -- (steps, K) point forecasts, lower bounds and upper bounds
+        """
+
+        point_forecast = self.forecast(y, steps)
+        q = stats.norm.ppf(1 - alpha / 2)
+        sigma = np.sqrt(np.diagonal(self.mse(steps), axis1=1, axis2=2))
+        return point_forecast, point_forecast - q * sigma, point_forecast + q * sigma
+
+
+def export_fit(lags, fit):
+    """ extracts the state of a fit regression so that it can be stored without statsmodels 
+        VAR results objects
+    
+    Arguments:
+        lags {int or None} -- lag order of the VAR, None for ARIMA
+        fit {VARResults or Arima} -- fit regression
+
+    Returns:
+        dict -- output of export_var_fit for VAR, the Arima object itself (under 'arima') for ARIMA
+    """
+
+    if lags is None:
+        return {"arima": fit}
+    state = export_var_fit(fit)
+    if isinstance(fit, VARFit):
+        state["backend"] = "numpy"
+    return state
+
+
+def restore_fit(lags, state, endog, dates=None):
+    """ rebuilds a fit regression from the state saved by export_fit
+    
+    Arguments:
+        lags {int or None} -- lag order of the VAR, None for ARIMA
+        state {dict} -- output of export_fit
+        endog {np array} -- (T, K) endogenous (differenced) series the regression was fit on
+
+    Keyword Arguments:
+        dates {pd DatetimeIndex} -- dates of the series (default: {None})
+
+    Returns:
+        VARResults, VARFit or Arima -- fit regression
+    """
+
+    if lags is None:
+        return state["arima"]
+    if state.get("backend") == "numpy":
+        return VARFit(endog, state["k_ar"], params=state["params"], sigma_u=state["sigma_u"])
+    return restore_var_fit(state, endog, dates)
+
+
+class FitCache:
+    def __init__(self, max_size=128, cache_dir=None):
+        """ least recently used cache of fit regressions, keyed by a fingerprint of the training
+            values and the hyperparameters that affect fitting. Entries are (lag order, output of 
+            export_fit) tuples. Entries can optionally also be persisted to a directory, which is 
+            not subject to eviction. Persisted entries are stored as numpy arrays with JSON 
+            metadata and read without unpickling, ARIMA entries are only kept in memory
+        
+        Keyword Arguments:
+            max_size {int} -- maximum number of entries to keep in memory (default: {128})
+            cache_dir {str} -- directory in which to persist entries (default: {None})
+        """
+
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(values, settings):
+        """ hashes training values together with fitting hyperparameters
+        
+        Arguments:
+            values {np array} -- values on which the regression is fit
+            settings {dict} -- hyperparameters that affect fitting
+
+        Returns:
+            str -- hex digest identifying the regression
+        """
+
+        values = np.ascontiguousarray(values)
+        digest = hashlib.sha1()
+        digest.update(
+            repr((values.shape, values.dtype.str, sorted(settings.items()))).encode()
+        )
+        digest.update(values.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ looks up an entry in memory, then on disk
+        
+        Arguments:
+            key {str} -- output of fingerprint
+
+        Returns:
+            tuple -- cached (lag order, state) entry, None on a miss
+        """
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        if self.cache_dir is not None:
+            entry = self._read(self._path(key))
+            if entry is not None:
+                self._insert(key, entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """ adds an entry, evicting the least recently used entries beyond max_size
+        
+        Arguments:
+            key {str} -- output of fingerprint
+            entry {tuple} -- lag order (None for ARIMA) and output of export_fit
+        """
+
+        self._insert(key, entry)
+        if self.cache_dir is not None:
+            self._write(self._path(key), entry)
+
+    def info(self):
+        """ cache statistics
+        
+        Returns:
+            dict -- hits, misses, evictions, current size and max size of the in-memory cache
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def _write(self, path, entry):
+        lags, state = entry
+        if lags is None:
+            return
+        arrays = {name: value for name, value in state.items() if isinstance(value, np.ndarray)}
+        metadata = {
+            "lags": int(lags),
+            "state": {name: value for name, value in state.items() if name not in arrays},
+        }
+
+        # write to a temporary file first so concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **{FIT_CACHE_METADATA: np.array(json.dumps(metadata))}, **arrays)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f"Could not persist fit cache entry: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _read(self, path):
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                metadata = json.loads(str(arrays[FIT_CACHE_METADATA]))
+                state = metadata["state"]
+                state.update(
+                    (name, arrays[name]) for name in arrays.files if name != FIT_CACHE_METADATA
+                )
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        return metadata["lags"], state
+
+
+_FIT_CACHES = {}
+
+
+def get_fit_cache(max_size, cache_dir=None):
+    """ returns the process-wide fit cache for cache_dir, so that regressions are shared 
+        between primitive instances (e.g. candidate pipelines in a search)
+    
+    Arguments:
+        max_size {int} -- maximum number of entries to keep in memory
+
+    Keyword Arguments:
+        cache_dir {str} -- directory in which to persist entries (default: {None})
+
+    Returns:
+        FitCache -- shared cache
+    """
+
+    if cache_dir not in _FIT_CACHES:
+        _FIT_CACHES[cache_dir] = FitCache(max_size, cache_dir)
+    fit_cache = _FIT_CACHES[cache_dir]
+    fit_cache.max_size = max_size
+    return fit_cache
@@ -0,0 +1,73 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WeightSnapshot:
+    def __init__(self, max_bytes=None):
+        """ snapshot of the weights of a model, kept in memory as a list of numpy arrays (from
+            get_weights) so that training can restart from the same weights without writing files
+            to the working directory. Snapshots larger than max_bytes, and models that can only
+            save their weights to files, are spilled to a temporary directory owned by the
+            snapshot, which is removed once the snapshot is garbage collected
+
+        Keyword Arguments:
+            max_bytes {int} -- size of the weights above which they are spilled to disk, never
+                if None (default: {None})
+        """
+
+        self.max_bytes = max_bytes
+        self._weights = None
+        self._path = None
+        self._directory = None
+
+    def save(self, model):
+        """ takes a snapshot of the weights of a model, replacing the previous one
+
+        Arguments:
+            model {keras Model} -- model with get_weights (or save_weights)
+        """
+
+        self._weights, self._path = None, None
+        if hasattr(model, "get_weights"):
+            weights = model.get_weights()
+            if self.max_bytes is None or sum(w.nbytes for w in weights) <= self.max_bytes:
+                self._weights = weights
+                return
+            self._path = os.path.join(self._spill_directory(), "weights.npz")
+            np.savez(self._path, *weights)
+        else:
+            self._path = os.path.join(self._spill_directory(), "weights.h5")
+            model.save_weights(self._path)
+        logger.debug(f"Spilled weight snapshot to {self._path}")
+
+    def restore(self, model):
+        """ sets the weights of a model from the snapshot
+
+        Arguments:
+            model {keras Model} -- model with the architecture of the saved model
+
+        Raises:
+            ValueError: if no snapshot was taken
+        """
+
+        if self._weights is not None:
+            model.set_weights(self._weights)
+        elif self._path is None:
+            raise ValueError("No weight snapshot has been taken")
+        elif self._path.endswith(".npz"):
+            with np.load(self._path) as weights:
+                model.set_weights([weights[f"arr_{i}"] for i in range(len(weights.files))])
+        else:
+            model.load_weights(self._path)
+
+    def _spill_directory(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="weights_")
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+        return self._directory
@@ -4,6 +4,8 @@ import numpy as np
 import pandas
 import time
 import logging
+import typing
+import collections
 
 from d3m.primitive_interfaces.base import CallResult
 from d3m.primitive_interfaces.supervised_learning import SupervisedLearnerPrimitiveBase
@@ -20,6 +22,7 @@ from TimeSeriesD3MWrappers.models.lstm_model_utils import (
     LSTMSequence,
     LSTMSequenceTest,
 )
+from TimeSeriesD3MWrappers.models.weight_utils import WeightSnapshot
 from sklearn.preprocessing import LabelEncoder
 
 __author__ = "Distil"
@@ -128,6 +131,22 @@ class Hyperparams(hyperparams.Hyperparams):
         ],
         description="number of workers to do if using multiprocessing threading",
     )
+    weight_snapshot_limit = hyperparams.Union[typing.Union[int, None]](
+        configuration=collections.OrderedDict(
+            limit=hyperparams.UniformInt(lower=0, upper=sys.maxsize, default=1024),
+            unlimited=hyperparams.Hyperparameter[None](
+                default=None,
+                description="Always keep the initial weights in memory",
+            ),
+        ),
+        default="unlimited",
+        description="maximum size in MB of the initial model weights kept in memory to restart \
+            training on new training data. Larger weights are written to a temporary directory of \
+            the primitive",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+    )
 
 
 class LSTM_FCN(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
@@ -199,6 +218,14 @@ class LSTM_FCN(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperpara
         self._is_fit = False
         self._new_train_data = False
 
+        # initial model weights, restored when fitting on new training data
+        if self.hyperparams["weight_snapshot_limit"] is None:
+            self._initial_weights = WeightSnapshot()
+        else:
+            self._initial_weights = WeightSnapshot(
+                self.hyperparams["weight_snapshot_limit"] * 2 ** 20
+            )
+
     def get_params(self) -> Params:
         return self._params
 
@@ -288,7 +315,7 @@ class LSTM_FCN(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperpara
         # self._clf.summary(print_fn = lambda x: print(x, file=sys.__stdout__))
 
         # save weights so we can start fitting from scratch (if desired by caller)
-        self._clf.save_weights("model_initial_weights.h5")
+        self._initial_weights.save(self._clf)
 
         # mark that new training data has been set
         self._new_train_data = True
@@ -306,7 +333,7 @@ class LSTM_FCN(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperpara
 
         # restore initial model weights if new training data
         if self._new_train_data:
-            self._clf.load_weights("model_initial_weights.h5")
+            self._initial_weights.restore(self._clf)
 
         # break out validation set if iterations arg not set
         if iterations is None:
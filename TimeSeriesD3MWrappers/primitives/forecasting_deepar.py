@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 import logging
 import collections
+import hashlib
 
 from d3m.primitive_interfaces.base import CallResult
 from d3m.primitive_interfaces.supervised_learning import SupervisedLearnerPrimitiveBase
@@ -13,6 +14,8 @@ from d3m.exceptions import PrimitiveNotFittedError
 
 from deepar.dataset.time_series import TimeSeries, TimeSeriesTest
 from deepar.model.learner import DeepARLearner
+from TimeSeriesD3MWrappers.models.time_utils import discretize_numeric_times, infer_time_step
+from TimeSeriesD3MWrappers.models.weight_utils import WeightSnapshot
 import tensorflow as tf
 import time
 from datetime import timedelta
@@ -28,6 +31,10 @@ Outputs = container.DataFrame
 logger = logging.getLogger(__name__)
 #logger.setLevel(logging.INFO)
 
+# with a timeout, the epochs trained after the timing epoch are budgeted at this many times 
+# the measured epoch time
+TIMEOUT_EPOCH_MARGIN = 1.1
+
 
 class Params(params.Params):
     pass
@@ -196,6 +203,32 @@ class Hyperparams(hyperparams.Hyperparams):
         description="number of samples to draw at each timestep, which will be used to calculate \
             confidence intervals",
     )
+    produce_mode = hyperparams.Enumeration(
+        default="auto",
+        values=["auto", "training", "test"],
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ControlParameter"
+        ],
+        description="whether produce inputs are the training data (in-sample predictions) or test \
+            data. 'auto' compares their shape, columns and a hash of their index, timestamp and \
+            grouping columns to those of the training data",
+    )
+    weight_snapshot_limit = hyperparams.Union[typing.Union[int, None]](
+        configuration=collections.OrderedDict(
+            limit=hyperparams.UniformInt(lower=0, upper=sys.maxsize, default=1024),
+            unlimited=hyperparams.Hyperparameter[None](
+                default=None,
+                description="Always keep the initial weights in memory",
+            ),
+        ),
+        default="unlimited",
+        description="maximum size in MB of the initial model weights kept in memory to restart \
+            training on new training data. Larger weights are written to a temporary directory of \
+            the primitive",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+    )
 
 
 class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
@@ -268,6 +301,14 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         self._is_fit = False
         self._new_train_data = False
 
+        # initial model weights, restored when fitting on new training data
+        if self.hyperparams["weight_snapshot_limit"] is None:
+            self._initial_weights = WeightSnapshot()
+        else:
+            self._initial_weights = WeightSnapshot(
+                self.hyperparams["weight_snapshot_limit"] * 2 ** 20
+            )
+
     def get_params(self) -> Params:
         return self._params
 
@@ -420,7 +461,21 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         )
 
         # save weights so we can restart fitting from scratch (if desired by caller)
-        self._learner.save_weights("model_initial_weights.h5")
+        self._initial_weights.save(self._learner_model())
+
+    def _learner_model(self):
+        """ private util function that finds the keras model wrapped by the learner, whose weights 
+            can be snapshot in memory
+
+            Returns:
+                keras Model or DeepARLearner -- wrapped model, the learner itself (which can only 
+                    save its weights to files) if it exposes none
+        """
+        for name in ("model", "_model"):
+            model = getattr(self._learner, name, None)
+            if hasattr(model, "get_weights"):
+                return model
+        return self._learner
 
     def set_training_data(self, *, inputs: Inputs, outputs: Outputs) -> None:
         """ Sets primitive's training data
@@ -433,9 +488,7 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
                 ValueError: If multiple columns are annotated with 'Time' or 'DateTime' metadata
         """
 
-        # save copy of train data so we don't predict for each row in training
         self._output_columns = outputs.columns
-        self._train_data = inputs.copy()
 
         # combine inputs and outputs for internal TimeSeries object
         self._ts_frame = inputs.append_columns(outputs)
@@ -444,12 +497,20 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         # TODO should only find cols to drop once!
         self._get_cols(self._ts_frame.metadata)
 
-        # Mark time difference (between min and min + 1 timestamp)
+        # save a fingerprint of train data (instead of a copy of the full frame) so we don't 
+        # predict for each row in training
+        self._key_columns = [
+            self._ts_frame.columns[idx]
+            for idx in (self._index_column, self._timestamp_column, self._grouping_column)
+            if idx is not None
+        ]
+        self._train_fingerprint = self._fingerprint(inputs)
+
+        # Mark time difference (most common difference between consecutive timestamps)
+        times = self._ts_frame.iloc[:, self._timestamp_column].values
         if self._grouping_column is None:
             self._max_train = max(self._ts_frame.iloc[:, self._timestamp_column])
-            self._train_diff = int(
-                np.diff(np.sort(self._ts_frame.iloc[:, self._timestamp_column]))[0]
-            )
+            self._train_diff = int(infer_time_step(times))
         else:
             g_col, t_col = (
                 self._ts_frame.columns[self._grouping_column],
@@ -458,9 +519,7 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             self._max_train = self._ts_frame.groupby(g_col)[t_col].agg("max")
             # making simplifying assumption that difference is the same across all groups
             self._train_diff = int(
-                self._ts_frame.groupby(g_col)[t_col]
-                .apply(lambda x: np.diff(np.sort(x))[0])
-                .iloc[0]
+                infer_time_step(times, pd.factorize(self._ts_frame[g_col])[0])
             )
 
         # assumption is that integer timestamps are days (treated this way by DeepAR objects)
@@ -487,20 +546,27 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         """ Fits DeepAR model using training data from set_training_data and hyperparameters
             
             Keyword Arguments:
-                timeout {float} -- timeout, considered (default: {None})
+                timeout {float} -- seconds within which to fit. A first epoch is then trained on 
+                    its own to measure the epoch time, and the epochs that fit in the remaining 
+                    budget in one more call, so that early stopping keeps a single patience 
+                    window. The timing epoch counts towards iterations_done but is outside that 
+                    window, and the budget is not re-estimated if epochs slow down later 
+                    (default: {None})
                 iterations {int} -- iterations, considered (default: {None})
             
             Returns:
                 CallResult[None]
         """
 
+        fit_start = time.time()
+
         # restore initial model weights if new training data
         if self._new_train_data:
 
             # only create new dataset object / model (w/out val) if new training data
             if iterations is not None:
                 self._create_data_object_and_learner(0)
-            self._learner.load_weights("model_initial_weights.h5")
+            self._initial_weights.restore(self._learner_model())
 
         if iterations is None:
             iterations_set = False
@@ -510,40 +576,24 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             iterations_set = True
             validation = False
 
-        # time training for 1 epoch so we can consider timeout argument thoughtfully
-        if timeout:
-            logger.info(
-                """Timing the fitting procedure for one epoch so we
-                can consider timeout thoughtfully"""
-            )
-            start_time = time.time()
-            _, iterations_completed = self._learner.fit(
-                validation=validation,
-                steps_per_epoch=self.hyperparams["steps_per_epoch"],
-                epochs=1,
-                stopping_patience=self.hyperparams["early_stopping_patience"],
-                stopping_delta=self.hyperparams["early_stopping_delta"],
-                tensorboard=False,
-            )
-            epoch_time_estimate = time.time() - start_time
-            # subract 1 for epoch that already happened and 1 more to be safe
-            timeout_epochs = timeout // epoch_time_estimate - 2
-            iters = min(timeout_epochs, iterations)
-        else:
-            iters = iterations
-
-        # normal fitting
-        logger.info(f"Fitting for {iters} iterations")
+        # with a timeout, train one epoch to time it, then the remaining epochs that fit in the 
+        # budget in a single call. All epochs, including the timing epoch, count
+        iterations_completed, early_stopped = 0, False
+        epochs = iterations
         start_time = time.time()
-
-        _, iterations_completed = self._learner.fit(
-            validation=validation,
-            steps_per_epoch=self.hyperparams["steps_per_epoch"],
-            epochs=iters,
-            stopping_patience=self.hyperparams["early_stopping_patience"],
-            stopping_delta=self.hyperparams["early_stopping_delta"],
-            tensorboard=False,
-        )
+        if timeout and iterations > 0:
+            iterations_completed = self._fit_epochs(1, validation)
+            epoch_time = time.time() - start_time
+            remaining = fit_start + timeout - time.time()
+            early_stopped = iterations_completed < 1
+            epochs = min(
+                iterations - iterations_completed,
+                int(remaining // (TIMEOUT_EPOCH_MARGIN * epoch_time)),
+            )
+        if epochs > 0 and not early_stopped:
+            epochs_completed = self._fit_epochs(epochs, validation)
+            iterations_completed += epochs_completed
+            early_stopped = epochs_completed < epochs
         logger.info(
             f"Fit for {iterations_completed} epochs, took {time.time() - start_time}s"
         )
@@ -555,7 +605,7 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         # use fitting history to set CallResult return values
         if iterations_set:
             has_finished = False
-        elif iters < iterations:
+        elif iterations_completed < iterations and not early_stopped:
             has_finished = False
         else:
             has_finished = self._is_fit
@@ -564,10 +614,33 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             None, has_finished=has_finished, iterations_done=iterations_completed
         )
 
+    def _fit_epochs(self, epochs, validation):
+        """ private util function:
+            trains the learner for a number of epochs
+
+            Arguments:
+                epochs {int} -- maximum number of epochs to train
+                validation {bool} -- whether to early stop on validation loss
+
+            Returns:
+                int -- number of epochs completed, fewer than epochs if stopped early
+        """
+
+        logger.info(f"Fitting for {epochs} iterations")
+        _, epochs_completed = self._learner.fit(
+            validation=validation,
+            steps_per_epoch=self.hyperparams["steps_per_epoch"],
+            epochs=epochs,
+            stopping_patience=self.hyperparams["early_stopping_patience"],
+            stopping_delta=self.hyperparams["early_stopping_delta"],
+            tensorboard=False,
+        )
+        return epochs_completed
+
     @classmethod
     def _discretize_time_difference(
         cls, times, initial_time, time_diff, integer_timestamps=False
-    ) -> typing.Sequence[int]:
+    ) -> np.ndarray:
         """method that discretizes sequence of datetimes (for prediction slices) 
         
             Arguments:
@@ -581,65 +654,12 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
                 integer_timestamps {bool} -- whether timestamps are integers or datetime values
             
             Returns:
-                typing.Sequence[int] -- prediction intervals expressed at specific time granularity
+                np.ndarray -- (N,) int64 prediction intervals expressed at specific time granularity
         """
 
-        SECONDS_PER_MINUTE = 60
-        MINUTES_PER_HOUR = 60
-        HOURS_PER_DAY = 24
-        DAYS_PER_WEEK = 7
-        DAYS_PER_MONTH = [30, 31]
-        DAYS_PER_YEAR = 365
-
-        s_per_year = (
-            SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_YEAR
-        )
-        s_per_month_30 = (
-            SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[0]
-        )
-        s_per_month_31 = (
-            SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[1]
+        return discretize_numeric_times(
+            times, initial_time, time_diff, integer_timestamps
         )
-        s_per_day = SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY
-        s_per_hr = SECONDS_PER_MINUTE * MINUTES_PER_HOUR
-
-        # edge case for integer timestamps
-        if integer_timestamps:
-            return [t - initial_time - 1 for t in times]
-
-        # take differences to convert to timedeltas
-        time_differences = times - initial_time
-
-        # granularity is years
-        if time_diff % s_per_year == 0 and time_diff >= s_per_year:
-            logger.debug("granularity is years")
-            time_differences = [x / s_per_year for x in time_differences]
-
-        # granularity is months
-        elif time_diff % s_per_month_31 == 0 and time_diff >= s_per_month_31:
-            logger.debug("granularity is months 31")
-            time_differences = [x / s_per_month_31 for x in time_differences]
-        elif time_diff % s_per_month_30 == 0 and time_diff >= s_per_month_30:
-            logger.debug("granularity is months 30")
-            time_differences = [x / s_per_month_30 for x in time_differences]
-
-        # granularity is days
-        elif time_diff % s_per_day == 0 and time_diff >= s_per_day:
-            logger.debug("granularity is days")
-            time_differences = [x / s_per_day for x in time_differences]
-
-        # granularity is hours
-        elif time_diff % s_per_hr == 0 and time_diff >= s_per_hr:
-            logger.debug("granularity is hours")
-            time_differences = [x / s_per_hr for x in time_differences]
-
-        # granularity is seconds
-        elif time_diff % SECONDS_PER_MINUTE == 0 and time_diff >= SECONDS_PER_MINUTE:
-            logger.debug("granularity is seconds")
-            time_differences = [x / SECONDS_PER_MINUTE for x in time_differences]
-
-        # we subtract one from list of differences because we want intervals to be 0 indexed
-        return [int(t) - 1 for t in time_differences]
 
     def _get_pred_intervals(self, df, keep_all=False):
         """ private util function that retrieves unevenly spaced prediction intervals from data frame 
@@ -684,6 +704,45 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
                 groups.append(group)
             return pd.Series(all_intervals, index=groups)
 
+    def _fingerprint(self, inputs):
+        """ private util function that computes a cheap fingerprint of a frame: its shape, its 
+            columns and a hash of its index, timestamp and grouping columns
+
+            Arguments:
+                inputs {Inputs} -- full D3M dataframe, containing attributes, key, and target
+
+            Returns:
+                tuple -- fingerprint, None if a key column is missing
+        """
+        if any(col not in inputs.columns for col in self._key_columns):
+            return None
+        row_hashes = pd.util.hash_pandas_object(inputs[self._key_columns], index=False)
+        return (
+            inputs.shape,
+            tuple(inputs.columns),
+            hashlib.sha1(row_hashes.values.tobytes()).hexdigest(),
+        )
+
+    def _is_training_data(self, inputs):
+        """ private util function that checks whether inputs are the training data, from the 
+            'produce_mode' hyperparameter or by comparing fingerprints. Frames of different 
+            shape or columns are rejected without hashing
+
+            Arguments:
+                inputs {Inputs} -- full D3M dataframe, containing attributes, key, and target
+
+            Returns:
+                bool -- whether inputs match the training data
+        """
+        if self.hyperparams["produce_mode"] != "auto":
+            return self.hyperparams["produce_mode"] == "training"
+        if self._train_fingerprint is None:
+            return False
+        shape, columns, _ = self._train_fingerprint
+        if inputs.shape != shape or tuple(inputs.columns) != columns:
+            return False
+        return self._fingerprint(inputs) == self._train_fingerprint
+
     def _create_new_test_frame(self, df, pred_intervals, max_t_train, granularity):
         """ private util function that creates new test frame from df and pred_intervals 
             to cover whole horizon 
@@ -766,7 +825,8 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             test_frame = inputs.copy()
 
         # training
-        if self._train_data.equals(inputs):
+        is_training_data = self._is_training_data(inputs)
+        if is_training_data:
             include_all_training = False
 
         # test
@@ -801,7 +861,7 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
         )
 
         # slice predictions with learned intervals for testing frame
-        if not self._train_data.equals(inputs):
+        if not is_training_data:
             all_preds = []
             for p, idxs in zip(preds, pred_intervals.values):
                 #all_preds.extend(p[: len(idxs)])  # this takes first n predictions
@@ -865,7 +925,8 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             test_frame = inputs.copy()
 
         # training
-        if self._train_data.equals(inputs):
+        is_training_data = self._is_training_data(inputs)
+        if is_training_data:
             include_all_training = False
 
         # test
@@ -902,10 +963,10 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
             f"Predicting {preds.shape[1]} timesteps into the future took {time.time() - start_time} s"
         )
 
-        # convert samples to percentiles
-        means = np.percentile(preds, 50, axis=2).reshape(-1, 1)
-        lowers = np.percentile(preds, alpha / 2 * 100, axis=2).reshape(-1, 1)
-        uppers = np.percentile(preds, (1 - alpha / 2) * 100, axis=2).reshape(-1, 1)
+        # convert samples to median and interval bounds, all quantiles in a single pass over the 
+        # sample axis: (3, series, horizon) -> (series * horizon, 3)
+        quantiles = np.quantile(preds, [0.5, alpha / 2, 1 - alpha / 2], axis=2)
+        quantiles = quantiles.reshape(3, -1).T
 
         # convert to df
         if self._grouping_column is None:
@@ -915,7 +976,7 @@ class DeepAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams
                 test_frame[test_frame.columns[self._grouping_column]].unique(), horizon
             )
         interval_df = pd.DataFrame(
-            np.concatenate((means, lowers, uppers), axis=1),
+            quantiles,
             columns=["mean", str(alpha / 2), str(1 - alpha / 2)],
             index=indices,
         )
@@ -1,11 +1,16 @@
 import sys
 import os
 import collections
+import copy
+import pickle
+import time
 import numpy as np
 import pandas as pd
 import typing
 from sklearn.preprocessing import OneHotEncoder
 from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from d3m.primitive_interfaces.base import CallResult
 from d3m.primitive_interfaces.supervised_learning import SupervisedLearnerPrimitiveBase
@@ -19,7 +24,35 @@ from statsmodels.tsa.api import VAR as vector_ar
 import statsmodels.api as sm
 import scipy.stats as stats
 
-from TimeSeriesD3MWrappers.models.var_model_utils import Arima
+from TimeSeriesD3MWrappers.models.var_model_utils import (
+    Arima,
+    FitCache,
+    TrainingBlock,
+    ValueArena,
+    VARFit,
+    VARStatistics,
+    export_fit,
+    fit_penalized_var,
+    fit_var_batch,
+    get_fit_cache,
+    restore_fit,
+    select_var_order,
+    var_predict,
+)
+from TimeSeriesD3MWrappers.models.time_utils import (
+    NS_PER_S,
+    datetime_nanoseconds,
+    discretize_datetimes,
+    frequency_alias,
+    frequency_grid,
+    grid_average,
+    grid_positions,
+    infer_time_step,
+    interpolate_columns,
+    most_common_step,
+    regularize,
+    time_step_counts,
+)
 
 import logging
 
@@ -33,37 +66,34 @@ __contact__ = "mailto:jeffrey.gleason@yonder.co"
 Inputs = container.pandas.DataFrame
 Outputs = container.pandas.DataFrame
 
-# define time constants
-SECONDS_PER_MINUTE = 60
-MINUTES_PER_HOUR = 60
-HOURS_PER_DAY = 24
-DAYS_PER_WEEK = 7
-DAYS_PER_MONTH = [28, 30, 31]
-DAYS_PER_YEAR = [365, 366]
+MAX_INT = np.finfo('d').max - 1
 
-S_PER_YEAR_0 = (
-    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_YEAR[0]
-)
-S_PER_YEAR_1 = (
-    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_YEAR[1]
-)
-S_PER_MONTH_28 = (
-    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[0]
-)
-S_PER_MONTH_30 = (
-    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[1]
-)
-S_PER_MONTH_31 = (
-    SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_MONTH[2]
-)
-S_PER_WEEK = SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY * DAYS_PER_WEEK
-S_PER_DAY = SECONDS_PER_MINUTE * MINUTES_PER_HOUR * HOURS_PER_DAY
-S_PER_HR = SECONDS_PER_MINUTE * MINUTES_PER_HOUR
+# relative cost of an ARIMA order search per observation, compared to VAR least squares
+ARIMA_COST_FACTOR = 2000
 
-MAX_INT = np.finfo('d').max - 1
+# fraction of the fit timeout kept to fit fallback regressions once full fits stop
+FIT_BUDGET_RESERVE = 0.1
 
 class Params(params.Params):
-    pass
+    is_fit: bool
+    time_column: typing.Optional[str]
+    integer_time: bool
+    key: typing.Optional[typing.Sequence[int]]
+    targets: typing.Optional[typing.Sequence[str]]
+    target_types: typing.Optional[typing.Sequence[str]]
+    target_indices: typing.Optional[typing.Sequence[int]]
+    cat_indices: typing.Sequence[int]
+    encoders: typing.Sequence[typing.Any]
+    filter_idxs: typing.Optional[typing.Sequence[typing.Any]]
+    freq: typing.Optional[str]
+    group_slots: typing.Dict
+    train_names: typing.Optional[typing.Sequence[typing.Any]]
+    train_index: typing.Optional[typing.Sequence[typing.Any]]
+    values: typing.Optional[typing.Sequence[np.ndarray]]
+    values_diff: typing.Optional[typing.Sequence[np.ndarray]]
+    positive: typing.Optional[typing.Sequence[bool]]
+    lag_order: typing.Sequence[typing.Any]
+    fits: typing.Sequence[typing.Dict]
 
 
 class Hyperparams(hyperparams.Hyperparams):
@@ -115,6 +145,87 @@ class Hyperparams(hyperparams.Hyperparams):
         ],
         description="whether to perform dynamic in-sample prediction with ARIMA model",
     )
+    arima_search = hyperparams.Enumeration(
+        default="stepwise",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ControlParameter"
+        ],
+        values=["stepwise", "grid"],
+        description="order search of ARIMA models. 'stepwise' uses pmdarima's auto_arima, 'grid' \
+            tests differencing orders once and fits candidate orders with p + q + P + Q up to the \
+            maximum order, in order of increasing complexity",
+    )
+    arima_max_fits = hyperparams.Union[typing.Union[int, None]](
+        configuration=collections.OrderedDict(
+            limit=hyperparams.UniformInt(lower=1, upper=sys.maxsize, default=20),
+            unlimited=hyperparams.Hyperparameter[None](
+                default=None,
+                description="Fit all candidate orders",
+            ),
+        ),
+        default="unlimited",
+        description="maximum number of candidate models fit per series by the 'grid' ARIMA order \
+            search",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ControlParameter"
+        ],
+    )
+    arima_threads = hyperparams.UniformInt(
+        lower=1,
+        upper=256,
+        default=1,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+        description="number of threads fitting candidate models of the 'grid' ARIMA order search",
+    )
+    update_drift_alpha = hyperparams.Uniform(
+        lower=0,
+        upper=1,
+        default=0.01,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ControlParameter"
+        ],
+        description="significance level of the chi-squared test on one-step-ahead errors of new \
+            observations passed to 'update'. VARs whose errors are significantly larger than their \
+            residual covariance are refit with lag order selection instead of being updated",
+    )
+    var_backend = hyperparams.Enumeration(
+        default="statsmodels",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ControlParameter"
+        ],
+        values=["statsmodels", "numpy"],
+        description="implementation used to select the lag order of, fit and forecast VAR models. \
+            'numpy' is a closed-form least squares engine that selects the lag order from the \
+            Cholesky factor of the lagged Gram matrix, falling back to a QR decomposition only for \
+            ill-conditioned windows, and gives the same results as 'statsmodels' at a fraction of \
+            the cost. \
+            With 'numpy', VARs whose training series have identical shapes are also fit together \
+            in batches",
+    )
+    var_estimator = hyperparams.Enumeration(
+        default="ols",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/TuningParameter"
+        ],
+        values=["ols", "ridge", "lasso"],
+        description="estimator of VAR coefficients. 'ols' is least squares with lag order \
+            selection by AIC. 'ridge' and 'lasso' are penalized least squares on standardized lags \
+            with lag order 'max_lag_order' (or 'default_lag_order' if it is automatically selected), \
+            for top-level grouping keys with many series relative to the number of time steps, \
+            where least squares is singular. 'lasso' sets uninformative coefficients to zero",
+    )
+    var_penalty = hyperparams.Uniform(
+        lower=0,
+        upper=10,
+        default=0.1,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/TuningParameter"
+        ],
+        description="weight of the penalty of the 'ridge' and 'lasso' VAR estimators, relative \
+            to the mean squared error",
+    )
     interpret_value = hyperparams.Enumeration(
         default="lag_order",
         semantic_types=[
@@ -153,6 +264,226 @@ class Hyperparams(hyperparams.Hyperparams):
             returns a 95%% confdience interval from alpha / 2 to 1 - (alpha / 2) . \
             Exposed through auxiliary 'produce_confidence_intervals' method",
     )
+    n_jobs = hyperparams.Union[typing.Union[int, None]](
+        configuration=collections.OrderedDict(
+            limit=hyperparams.UniformInt(lower=1, upper=256, default=1),
+            all_cores=hyperparams.Hyperparameter[None](
+                default=None,
+                description="Use all available cores",
+            ),
+        ),
+        default="limit",
+        description="number of worker processes used to fit the regressions (one per top-level \
+            grouping key) in parallel. If 1, regressions are fit serially",
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+    )
+    fit_cache_size = hyperparams.UniformInt(
+        lower=0,
+        upper=sys.maxsize,
+        default=0,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+        description="maximum number of fitted regressions to keep in an in-memory LRU cache shared \
+            by all VAR primitives in the process. Regressions are keyed by their training values and \
+            fitting hyperparameters, so refitting identical data is skipped. If 0, no cache is used",
+    )
+    fit_cache_dir = hyperparams.Hyperparameter[typing.Union[str, None]](
+        default=None,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+        description="optional directory in which cached VAR regressions are also persisted (as \
+            numpy arrays, ARIMA regressions are only cached in memory), so that they can be shared \
+            between processes and runs. Only used if 'fit_cache_size' > 0",
+    )
+    memmap_dir = hyperparams.Hyperparameter[typing.Union[str, None]](
+        default=None,
+        semantic_types=[
+            "https://metadata.datadrivendiscovery.org/types/ResourcesUseParameter"
+        ],
+        description="optional directory in which the training values of all regressions are kept \
+            in a single memory-mapped file after fit (or set_params), so that they are paged in from \
+            disk when needed instead of being resident in memory. If None, they are kept in memory",
+    )
+
+
+def _copy_sequence(values):
+    """ copies a per-regression list, so that params don't share the lists that update extends 
+        in place with the primitive
+
+        Arguments:
+            values {Sequence or None} -- per-regression values, None before fitting
+
+        Returns:
+            list or None -- copied values
+    """
+    if values is None:
+        return None
+    return list(values)
+
+
+def _fit_regression(vals, dates, settings):
+    """ fits a single regression on differenced data: VAR if the data is multivariate, ARIMA 
+        otherwise. Module-level so that it can be sent to worker processes
+
+        Arguments:
+            vals {np array} -- (T, K) differenced time series
+            dates {pd DatetimeIndex} -- time index of the undifferenced series
+            settings {dict} -- hyperparameters relevant to fitting
+
+        Returns:
+            tuple(int or None, fit) -- selected lag order (None for ARIMA) and fit model
+    """
+
+    # penalized VAR
+    if vals.shape[1] > 1 and settings["var_estimator"] != "ols":
+        return _fit_penalized_regression(vals, settings)
+
+    # VAR
+    if vals.shape[1] > 1:
+        if settings["var_backend"] == "numpy":
+            model = None
+        else:
+            model = vector_ar(vals, dates=dates)
+        try:
+            if model is None:
+                lags = select_var_order(vals, maxlags=settings["max_lag_order"])
+            else:
+                lags = model.select_order(maxlags=settings["max_lag_order"]).aic
+            logger.info(
+                "Successfully performed model order selection. Optimal order = {} lags".format(
+                    lags
+                )
+            )
+        except np.linalg.LinAlgError:
+            lags = settings["default_lag_order"]
+            logger.debug(
+                f"Matrix decomposition error (maybe redundant columns in this grouping). Using default lag order of {lags}"
+            )
+        except ValueError as e:
+            lags = 0
+            logger.debug('ValueError: ' + str(e) + '. Using lag order of 0')
+        if model is None:
+            return lags, VARFit(vals, lags)
+        return lags, model.fit(maxlags=lags)
+
+    # ARIMA
+    else:
+        model = Arima(
+            seasonal=settings["seasonal"],
+            seasonal_differencing=settings["seasonal_differencing"],
+            max_order=settings["arima_max_order"],
+            dynamic=settings["dynamic"],
+            search=settings["arima_search"],
+            max_fits=settings["arima_max_fits"],
+            n_threads=settings["arima_threads"],
+        )
+        X_train = pd.Series(data=vals.reshape((-1,)), index=dates[: vals.shape[0]])
+        model.fit(X_train)
+        return None, model
+
+
+def _fit_penalized_regression(vals, settings, lags=None):
+    """ fits a ridge or lasso VAR on differenced data
+
+        Arguments:
+            vals {np array} -- (T, K) differenced time series
+            settings {dict} -- hyperparameters relevant to fitting
+
+        Keyword Arguments:
+            lags {int} -- lag order, 'max_lag_order' (or 'default_lag_order' if it is 
+                automatically selected) if None (default: {None})
+
+        Returns:
+            tuple(int, VARFit) -- lag order (0 if there are too few observations) and fit model
+    """
+    if lags is None:
+        lags = settings["max_lag_order"]
+        if lags is None:
+            lags = settings["default_lag_order"]
+
+    # keep at least two observations to standardize lagged values
+    lags = min(lags, vals.shape[0] - 2)
+    if lags < 1:
+        logger.debug("Too few observations for a penalized VAR. Using lag order of 0")
+        return 0, VARFit(vals, 0)
+    return lags, fit_penalized_var(
+        vals, lags, estimator=settings["var_estimator"], penalty=settings["var_penalty"]
+    )
+
+
+def _timed_fit_regression(vals, dates, settings):
+    """ _fit_regression that also returns its duration in seconds
+    """
+    start = time.time()
+    result = _fit_regression(vals, dates, settings)
+    return result, time.time() - start
+
+
+def _fit_fallback(vals, dates, settings, drift=False):
+    """ fits a cheap regression on differenced data, used when the time budget of fit runs out: 
+        VAR with the default lag order if the data is multivariate, ARIMA of default order otherwise. 
+        Falls back to drift (lag 0 VAR, i.e. mean of the differenced data) if they cannot be fit
+
+        Arguments:
+            vals {np array} -- (T, K) differenced time series
+            dates {pd DatetimeIndex} -- time index of the undifferenced series
+            settings {dict} -- hyperparameters relevant to fitting
+
+        Keyword Arguments:
+            drift {bool} -- whether to directly fit drift (default: {False})
+
+        Returns:
+            tuple(int or None, fit) -- lag order (None for ARIMA) and fit model
+    """
+
+    if not drift:
+        try:
+            if vals.shape[1] > 1:
+                lags = settings["default_lag_order"]
+                if settings["var_estimator"] != "ols":
+                    return _fit_penalized_regression(vals, settings, lags)
+                if settings["var_backend"] == "numpy":
+                    return lags, VARFit(vals, lags)
+                return lags, vector_ar(vals, dates=dates).fit(maxlags=lags)
+            model = Arima(dynamic=settings["dynamic"], search="fixed")
+            model.fit(pd.Series(data=vals.reshape((-1,)), index=dates[: vals.shape[0]]))
+            return None, model
+        except (ValueError, np.linalg.LinAlgError) as e:
+            logger.debug(f"Could not fit fallback regression ({e}), using drift")
+    return 0, VARFit(vals, 0)
+
+
+def _fit_cost(vals, dates, settings):
+    """ relative cost of fitting a regression, used to schedule fits within a time budget
+
+        Arguments:
+            vals {np array} -- (T, K) differenced time series
+            dates {pd DatetimeIndex} -- time index of the undifferenced series
+            settings {dict} -- hyperparameters relevant to fitting
+
+        Returns:
+            float -- cost estimate
+    """
+    n_obs, k = vals.shape
+    if k > 1 and settings["var_estimator"] != "ols":
+        # a single penalized fit of width K * lags
+        lags = settings["max_lag_order"]
+        if lags is None:
+            lags = settings["default_lag_order"]
+        return n_obs * k * (k * lags + 1)
+    if k > 1:
+        # order selection solves max lag order least squares problems of width K * lags
+        if settings["max_lag_order"] is None:
+            max_lags = 12 * (n_obs / 100.0) ** (1 / 4.0)
+        else:
+            max_lags = settings["max_lag_order"]
+        return n_obs * (k * (max_lags + 1)) ** 2
+    # order search fits tens of state space models
+    return n_obs * ARIMA_COST_FACTOR
 
 
 class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
@@ -217,6 +548,7 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
         self._target_types = None
         self._targets = None
         self.times = None
+        self.time_column = None
         self.key = None
         self.integer_time = False
         self.target_indices = None
@@ -229,21 +561,100 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
         # information about interpolation
         self.freq = None
         self.interpolation_ranges = None
+        self._interpolation_bounds = None
+        self._group_slots = {}
 
         # data needed to fit model and reconstruct predictions
         self._X_train_names = None
         self._X_train = None
         self._mins = None
+        self._positive = None
+        self._train_index = None
         self._lag_order = []
         self._values = None
+        self._values_diff = None
+        self._arena = None
         self._fits = []
+        self._var_statistics = []
         self._is_fit = False
+        self.fit_times = None
+
+        # forecasts cached across produce calls, reset when regressions change
+        self._in_sample_fits = []
+        self._forecast_paths = []
+        self._interval_cache = None
+
+        # cache of fitted regressions, shared with other primitives in this process
+        if self.hyperparams["fit_cache_size"] > 0:
+            self.fit_cache = get_fit_cache(
+                self.hyperparams["fit_cache_size"], self.hyperparams["fit_cache_dir"]
+            )
+        else:
+            self.fit_cache = None
 
     def get_params(self) -> Params:
-        return self._params
+        """ VAR fits are exported as arrays (coefficients, k_ar, sigma_u) instead of statsmodels 
+            results objects, so that params are compact and can be restored without refitting
+        """
+        return Params(
+            is_fit=self._is_fit,
+            time_column=self.time_column,
+            integer_time=self.integer_time,
+            key=self.key,
+            targets=self._targets,
+            target_types=self._target_types,
+            target_indices=self.target_indices,
+            cat_indices=self._cat_indices,
+            encoders=self._encoders,
+            filter_idxs=self.filter_idxs,
+            freq=self.freq,
+            group_slots=self._group_slots,
+            train_names=self._X_train_names,
+            train_index=_copy_sequence(self._train_index),
+            values=_copy_sequence(self._values),
+            values_diff=_copy_sequence(self._values_diff),
+            positive=_copy_sequence(self._positive),
+            lag_order=list(self._lag_order),
+            fits=[
+                export_fit(lags, fit) for fit, lags in zip(self._fits, self._lag_order)
+            ],
+        )
 
     def set_params(self, *, params: Params) -> None:
-        self.params = params
+        self._is_fit = params["is_fit"]
+        self.time_column = params["time_column"]
+        self.integer_time = params["integer_time"]
+        self.key = params["key"]
+        self._targets = params["targets"]
+        self._target_types = params["target_types"]
+        self.target_indices = params["target_indices"]
+        self._cat_indices = params["cat_indices"]
+        self._encoders = params["encoders"]
+        self.filter_idxs = params["filter_idxs"]
+        self.freq = params["freq"]
+        self._group_slots = params["group_slots"]
+        self._X_train_names = params["train_names"]
+        self._train_index = _copy_sequence(params["train_index"])
+        self._values = _copy_sequence(params["values"])
+        self._values_diff = _copy_sequence(params["values_diff"])
+        if self.hyperparams["memmap_dir"] is not None and self._values is not None:
+            self._map_training_values(self._values_diff)
+        self._positive = _copy_sequence(params["positive"])
+        self._lag_order = list(params["lag_order"])
+        self._X_train = None
+        self._var_statistics = [None for lags in self._lag_order]
+
+        # rebuild fits from saved arrays, params of unfit primitives have none
+        if self._is_fit:
+            self._fits = [
+                restore_fit(lags, state, vals, dates)
+                for state, lags, vals, dates in zip(
+                    params["fits"], self._lag_order, self._values_diff, self._train_index
+                )
+            ]
+        else:
+            self._fits = []
+        self._reset_forecast_cache()
 
     def set_training_data(self, *, inputs: Inputs, outputs: Outputs) -> None:
         """ Sets primitive's training data
@@ -255,11 +666,291 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
             Raises:
                 ValueError: If multiple columns are annotated with 'Time' or 'DateTime' metadata
         """
-        # make copy of input data!
-        inputs_copy = inputs.copy()
+        # mark datetime, key, grp and target variables
+        grouping_keys = self._read_schema(inputs)
+
+        # use 'SuggestedGroupingKey' to intelligently calculate grouping key order -
+        # we sort keys so that VAR can operate on as many series as possible simultaneously (reverse order)
+        grouping_keys_counts = [
+            inputs.iloc[:, key_idx].nunique() for key_idx in grouping_keys
+        ]
+        grouping_keys = [
+            group_key
+            for count, group_key in sorted(zip(grouping_keys_counts, grouping_keys))
+        ]
+        self.filter_idxs = [list(inputs)[key] for key in grouping_keys]
+
+        # project all columns but index and grouping keys, sorted by time, instead of copying 
+        # the full container
+        drop_idx = self.key + self.grp
+        inputs_copy = self._project_columns(
+            inputs, [col for i, col in enumerate(list(inputs)) if i not in drop_idx]
+        )
+
+        # check whether no grouping keys are labeled
+        if len(grouping_keys) == 0:
+
+            self._set_ungrouped_training_data(inputs_copy)
+
+        else:
+            # find interpolation range from outermost grouping key
+            if len(grouping_keys) == 1:
+                date_ranges = inputs_copy.agg({self.time_column: ["min", "max"]})
+                indices = inputs[self.filter_idxs[0]].unique()
+                self.interpolation_ranges = pd.Series(
+                    [date_ranges] * len(indices), index=indices
+                )
+                self._group_slots = {}
+                self._interpolation_bounds = [
+                    (date_ranges[self.time_column]["min"], date_ranges[self.time_column]["max"])
+                ]
+                self._X_train = [None]
+                self._X_train_names = [[]]
+            else:
+                self.interpolation_ranges = inputs_copy.groupby(
+                    self.filter_idxs[:-1]
+                ).agg({self.time_column: ["min", "max"]})
+
+                # hash index from top-level grouping key to training slot, built once and reused
+                # whenever a group needs to be matched to its regression
+                self._group_slots = {
+                    group_value: slot
+                    for slot, group_value in enumerate(self.interpolation_ranges.index.to_flat_index())
+                }
+                self._interpolation_bounds = list(
+                    zip(
+                        self.interpolation_ranges[(self.time_column, "min")],
+                        self.interpolation_ranges[(self.time_column, "max")],
+                    )
+                )
+                self._X_train = [None for i in range(self.interpolation_ranges.shape[0])]
+                self._X_train_names = [[] for i in range(self.interpolation_ranges.shape[0])]
+            
+            # map all groups onto the time grid of their top-level grouping key at once, 
+            # assuming frequency is the same across all time series
+            grouped = inputs_copy.groupby(self.filter_idxs)
+            names = list(grouped.size().index.to_flat_index())
+            series = grouped.ngroup().values
+            rows = series >= 0
+            series = series[rows]
+            times = datetime_nanoseconds(inputs_copy[self.time_column])[rows]
+            self.freq = self._infer_frequency(times, series)
+
+            value_columns = [
+                col for col in list(inputs_copy) 
+                if col != self.time_column and col not in self.filter_idxs
+            ]
+            self.target_indices = [
+                i for i, col_name in enumerate(value_columns) if col_name in self._targets
+            ]
+            series_slots = np.array([self._get_group_slot(name) for name in names])
+            grids = [
+                frequency_grid(min_date, max_date, self.freq) 
+                for min_date, max_date in self._interpolation_bounds
+            ]
+            values = regularize(
+                times, 
+                series, 
+                inputs_copy[value_columns].values[rows], 
+                [datetime_nanoseconds(grid) for grid in grids], 
+                series_slots,
+            )
+
+            # groups of each top-level grouping key side by side, in groupby order
+            order = np.argsort(series_slots, kind="mergesort")
+            slot_ends = np.cumsum(np.bincount(series_slots, minlength=len(grids)))
+            for slot, slot_series in enumerate(np.split(order, slot_ends[:-1])):
+                grid = grids[slot]
+                self._X_train[slot] = pd.DataFrame(
+                    values[: len(grid), slot_series].reshape(len(grid), -1), 
+                    index=grid, 
+                    columns=value_columns * len(slot_series),
+                )
+                self._X_train_names[slot] = [names[i] for i in slot_series]
+
+    def set_training_data_from_chunks(
+        self,
+        *,
+        inputs: Inputs,
+        chunks: typing.Union[str, typing.Callable[[], typing.Iterable[pd.DataFrame]]],
+        chunksize: int = 100000,
+    ) -> None:
+        """ Sets primitive's training data from long-form data streamed in chunks, so that peak 
+            memory is bounded by the training blocks and the largest group instead of multiples 
+            of the full dataset. Chunks are read twice: the first pass finds grouping key 
+            cardinalities and the time range and number of groups of each top-level grouping key, 
+            the second pass accumulates the rows of each group and interpolates it into its 
+            training block as soon as it is complete
+        
+            Arguments:
+                inputs {Inputs} -- D3M dataframe with the columns and column metadata of the chunks 
+                    (e.g. their first rows), used to mark datetime, key, grouping key and target columns
+                chunks {str or Callable} -- path of a CSV file, or function returning a new iterator 
+                    over DataFrame chunks. The rows of each group (combination of grouping keys) must 
+                    be contiguous, e.g. sorted by grouping keys
+
+            Keyword Arguments:
+                chunksize {int} -- number of rows per chunk when reading a CSV file (default: {100000})
+            
+            Raises:
+                ValueError: If multiple columns are annotated with 'Time' or 'DateTime' metadata, or 
+                    if the rows of a group are not contiguous
+        """
+
+        if isinstance(chunks, str):
+            path = chunks
+            chunks = lambda: pd.read_csv(path, chunksize=chunksize)
+
+        # mark datetime, key, grp and target variables
+        self.freq = None
+        grouping_keys = self._read_schema(inputs)
+        columns = list(inputs)
+        drop_columns = [columns[idx] for idx in self.key + self.grp]
+
+        def read_chunks():
+            for chunk in chunks():
+                chunk = chunk.drop(columns=drop_columns)
+                chunk[self.time_column] = self._parse_times(chunk[self.time_column])
+                yield chunk
 
+        # without grouping keys the only group is the full dataset
+        if len(grouping_keys) == 0:
+            self.filter_idxs = []
+            frame = pd.concat(list(read_chunks()), ignore_index=True)
+            self._set_ungrouped_training_data(frame.sort_values(by=[self.time_column]))
+            return
+
+        # first pass: grouping key cardinalities, time range of each group and time steps within 
+        # groups (steps across chunk boundaries are not counted)
+        key_names = [columns[key] for key in grouping_keys]
+        key_values = [set() for key in grouping_keys]
+        group_ranges = {}
+        step_counts = collections.Counter()
+        for chunk in read_chunks():
+            for values, key_name in zip(key_values, key_names):
+                values.update(chunk[key_name].unique())
+            steps, counts = time_step_counts(
+                datetime_nanoseconds(chunk[self.time_column]),
+                chunk.groupby(key_names, sort=False).ngroup().values,
+            )
+            step_counts.update(dict(zip(steps.tolist(), counts.tolist())))
+            ranges = chunk.groupby(key_names)[self.time_column].agg(["min", "max"])
+            for name, min_time, max_time in zip(
+                ranges.index.to_flat_index(), ranges["min"], ranges["max"]
+            ):
+                name = name if isinstance(name, tuple) else (name,)
+                if name in group_ranges:
+                    min_time = min(min_time, group_ranges[name][0])
+                    max_time = max(max_time, group_ranges[name][1])
+                group_ranges[name] = (min_time, max_time)
+
+        steps = np.array(sorted(step_counts), dtype=np.int64)
+        self.freq = self._step_frequency(
+            most_common_step(steps, np.array([step_counts[step] for step in steps]))
+        )
+
+        # same grouping key order as set_training_data
+        key_order = [
+            i for count, key, i in sorted(
+                zip([len(values) for values in key_values], grouping_keys, range(len(grouping_keys)))
+            )
+        ]
+        self.filter_idxs = [key_names[i] for i in key_order]
+
+        # interpolation range, slot and number of groups of each top-level grouping key
+        if len(self.filter_idxs) == 1:
+            self._group_slots = {}
+            slot_ranges = {
+                None: (
+                    min(min_time for min_time, _ in group_ranges.values()),
+                    max(max_time for _, max_time in group_ranges.values()),
+                )
+            }
+            slot_sizes = {None: len(group_ranges)}
+        else:
+            slot_ranges, slot_sizes = {}, collections.Counter()
+            for name, (min_time, max_time) in group_ranges.items():
+                name = [name[i] for i in key_order]
+                slot_key = tuple(name[:-1]) if len(name) > 2 else name[0]
+                if slot_key in slot_ranges:
+                    min_time = min(min_time, slot_ranges[slot_key][0])
+                    max_time = max(max_time, slot_ranges[slot_key][1])
+                slot_ranges[slot_key] = (min_time, max_time)
+                slot_sizes[slot_key] += 1
+            self._group_slots = {
+                slot_key: slot for slot, slot_key in enumerate(sorted(slot_ranges))
+            }
+        slot_keys = sorted(slot_ranges, key=lambda slot_key: self._group_slots.get(slot_key, 0))
+        self._interpolation_bounds = [slot_ranges[slot_key] for slot_key in slot_keys]
+        training_blocks = [TrainingBlock(slot_sizes[slot_key]) for slot_key in slot_keys]
+        self._X_train_names = [[] for slot_key in slot_keys]
+
+        # second pass: add each group to its training block once all of its rows have been read
+        current_name, current_rows, completed = None, [], set()
+        for chunk in read_chunks():
+            for name, rows in chunk.groupby(self.filter_idxs, sort=False):
+                name = self._group_name(name)
+                if len(current_rows) and name != current_name:
+                    group = pd.concat(current_rows).sort_values(by=[self.time_column])
+                    self._add_training_group(current_name, group, training_blocks)
+                    completed.add(current_name)
+                    current_rows = []
+                if name in completed:
+                    raise ValueError(
+                        f"Rows of group {name} are not contiguous. Please sort chunks by grouping keys"
+                    )
+                current_name = name
+                current_rows.append(rows)
+        if len(current_rows):
+            group = pd.concat(current_rows).sort_values(by=[self.time_column])
+            self._add_training_group(current_name, group, training_blocks)
+
+        # order groups like groupby does in set_training_data
+        for block, names in zip(training_blocks, self._X_train_names):
+            order = sorted(range(len(names)), key=lambda i: names[i])
+            block.reorder(order)
+            names[:] = [names[i] for i in order]
+        self._X_train = [block.to_frame() for block in training_blocks]
+
+    def _set_ungrouped_training_data(self, frame):
+        """ private util function that sets training data without grouping keys: a single 
+            regression of all series
+
+            Arguments:
+                frame {pd DataFrame} -- training data with parsed datetime column, sorted by time
+        """
+        # avg across duplicated time indices and interpolate onto the training frequency
+        times = datetime_nanoseconds(frame[self.time_column])
+        self.freq = self._infer_frequency(times)
+        grid = frequency_grid(
+            frame[self.time_column].min(), frame[self.time_column].max(), self.freq
+        )
+        frame = self._regularize_group(frame, times, grid)
+
+        # set X train and target idxs
+        self.target_indices = [
+            i
+            for i, col_name in enumerate(list(frame))
+            if col_name in self._targets
+        ]
+        self._X_train = [frame]
+        self._X_train_names = [frame.columns]
+
+    def _read_schema(self, inputs):
+        """ private util function that marks the datetime, key, grp and target columns of 
+            training data from its metadata
+
+            Arguments:
+                inputs {Inputs} -- D3M dataframe with column metadata
+
+            Raises:
+                ValueError: If multiple columns are annotated with 'Time' or 'DateTime' metadata
+
+            Returns:
+                Sequence[int] -- indices of 'SuggestedGroupingKey' columns
+        """
         # mark datetime column
-        times = inputs_copy.metadata.list_columns_with_semantic_types(
+        times = inputs.metadata.list_columns_with_semantic_types(
             (
                 "https://metadata.datadrivendiscovery.org/types/Time",
                 "http://schema.org/DateTime",
@@ -269,35 +960,24 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
             raise ValueError(
                 f"There are {len(times)} indices marked as datetime values. Please only specify one"
             )
-        self.time_column = list(inputs_copy)[times[0]]
+        self.time_column = list(inputs)[times[0]]
 
         # if datetime columns are integers, parse as # of days
-        if (
+        self.integer_time = (
             "http://schema.org/Integer"
             in inputs.metadata.query_column(times[0])["semantic_types"]
-        ):
-            self.integer_time = True
-            inputs_copy[self.time_column] = pd.to_datetime(
-                inputs_copy[self.time_column] - 1, unit="D"
-            )
-        else:
-            inputs_copy[self.time_column] = pd.to_datetime(
-                inputs_copy[self.time_column], unit="s"
-            )
-
-        # sort by time column
-        inputs_copy = inputs_copy.sort_values(by = [self.time_column])
+        )
 
         # mark key and grp variables
-        self.key = inputs_copy.metadata.get_columns_with_semantic_type(
+        self.key = inputs.metadata.get_columns_with_semantic_type(
             "https://metadata.datadrivendiscovery.org/types/PrimaryKey"
         )
-        self.grp = inputs_copy.metadata.get_columns_with_semantic_type(
+        self.grp = inputs.metadata.get_columns_with_semantic_type(
             "https://metadata.datadrivendiscovery.org/types/GroupingKey"
         )
 
         # mark target variables
-        self._targets = inputs_copy.metadata.list_columns_with_semantic_types(
+        self._targets = inputs.metadata.list_columns_with_semantic_types(
             (
                 "https://metadata.datadrivendiscovery.org/types/SuggestedTarget",
                 "https://metadata.datadrivendiscovery.org/types/TrueTarget",
@@ -307,122 +987,317 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
         self._target_types = [
             "i"
             if "http://schema.org/Integer"
-            in inputs_copy.metadata.query_column(t)["semantic_types"]
+            in inputs.metadata.query_column(t)["semantic_types"]
             else "c"
             if "https://metadata.datadrivendiscovery.org/types/CategoricalData"
-            in inputs_copy.metadata.query_column(t)["semantic_types"]
+            in inputs.metadata.query_column(t)["semantic_types"]
             else "f"
             for t in self._targets
         ]
-        self._targets = [list(inputs_copy)[t] for t in self._targets]
+        self._targets = [list(inputs)[t] for t in self._targets]
 
-        # use 'SuggestedGroupingKey' to intelligently calculate grouping key order -
-        # we sort keys so that VAR can operate on as many series as possible simultaneously (reverse order)
-        grouping_keys = inputs_copy.metadata.get_columns_with_semantic_type(
+        return inputs.metadata.get_columns_with_semantic_type(
             "https://metadata.datadrivendiscovery.org/types/SuggestedGroupingKey"
         )
-        grouping_keys_counts = [
-            inputs_copy.iloc[:, key_idx].nunique() for key_idx in grouping_keys
-        ]
-        grouping_keys = [
-            group_key
-            for count, group_key in sorted(zip(grouping_keys_counts, grouping_keys))
+
+    def _project_columns(self, inputs, columns):
+        """ private util function that extracts columns of a D3M dataframe into a plain 
+            DataFrame sorted by (parsed) time, leaving the container and its metadata untouched
+
+            Arguments:
+                inputs {Inputs} -- D3M dataframe
+                columns {Sequence[str]} -- names of the columns to extract, must include the 
+                    datetime column
+
+            Returns:
+                pd DataFrame -- extracted columns, sorted by time
+        """
+        times = np.asarray(self._parse_times(inputs[self.time_column]))
+        order = np.argsort(times, kind="mergesort")
+        return pd.DataFrame(
+            {
+                col: times[order] if col == self.time_column else inputs[col].values[order]
+                for col in columns
+            },
+            columns=columns,
+        )
+
+    def _parse_times(self, times):
+        """ private util function that parses the datetime column, integers as # of days and 
+            other values as seconds
+
+            Arguments:
+                times {pd Series} -- raw datetime column
+
+            Returns:
+                pd Series -- datetimes
+        """
+        if self.integer_time:
+            return pd.to_datetime(times - 1, unit="D")
+        return pd.to_datetime(times, unit="s")
+
+    def _add_training_group(self, name, group, training_blocks):
+        """ private util function that averages duplicated time indices of a group, interpolates 
+            it over the range of its top-level grouping key and adds it to that key's training block
+
+            Arguments:
+                name {Any} -- group name, as produced by groupby on filter_idxs
+                group {pd DataFrame} -- rows of the group, sorted by time
+                training_blocks {Sequence[TrainingBlock]} -- training block of each top-level grouping key
+        """
+        training_idx = self._get_group_slot(name)
+        group = group.drop(columns=self.filter_idxs)
+
+        # avg across duplicated time indices and interpolate over the range of the top-level 
+        # grouping key, assuming frequency is the same across all time series
+        times = datetime_nanoseconds(group[self.time_column])
+        group = self._regularize_group(
+            group, times, frequency_grid(*self._interpolation_bounds[training_idx], self.freq)
+        )
+
+        # add to training data under appropriate top-level grouping key
+        self.target_indices = [
+            i
+            for i, col_name in enumerate(list(group))
+            if col_name in self._targets
         ]
-        self.filter_idxs = [list(inputs_copy)[key] for key in grouping_keys]
+        training_blocks[training_idx].add(group)
+        self._X_train_names[training_idx].append(name)
 
-        # drop index and grouping keys
-        drop_idx = self.key + self.grp
-        inputs_copy.drop(
-            columns=[list(inputs_copy)[idx] for idx in drop_idx], inplace=True
+    def _regularize_group(self, frame, times, grid):
+        """ private util function that averages the observations of a frame on the nearest time 
+            of a grid and interpolates the grid times without observations
+
+            Arguments:
+                frame {pd DataFrame} -- frame with time column
+                times {np array} -- (N,) int64 nanosecond times of the frame
+                grid {pd DatetimeIndex} -- regular time grid
+
+            Returns:
+                pd DataFrame -- frame indexed by the grid
+        """
+        columns = [col for col in list(frame) if col != self.time_column]
+        values = regularize(
+            times, 
+            np.zeros(len(times), dtype=np.int64), 
+            frame[columns].values, 
+            [datetime_nanoseconds(grid)], 
+            [0],
         )
+        return pd.DataFrame(values[:, 0], index=grid, columns=columns)
 
-        # check whether no grouping keys are labeled
-        if len(grouping_keys) == 0:
+    def _infer_frequency(self, times, series=None):
+        """ private util function that infers the training frequency from the most common time 
+            step of the training series
 
-            # avg across duplicated time indices if necessary and re-index
-            if sum(inputs_copy[self.time_column].duplicated()) > 0:
-                inputs_copy = inputs_copy.groupby(self.time_column).mean()
-            else:
-                inputs_copy = inputs_copy.set_index(self.time_column)
+            Arguments:
+                times {np array} -- (N,) int64 nanosecond times
 
-            # interpolate
-            self.freq = self._calculate_time_frequency(inputs_copy.index[1] - inputs_copy.index[0])
-            inputs_copy = inputs_copy.interpolate(method="time", limit_direction="both")
+            Keyword Arguments:
+                series {np array} -- (N,) code of the series of each time, all times belong to the 
+                    same series if None (default: {None})
 
-            # set X train and target idxs
-            self.target_indices = [
-                i
-                for i, col_name in enumerate(list(inputs_copy))
-                if col_name in self._targets
-            ]
-            self._X_train = [inputs_copy]
-            self._X_train_names = [inputs_copy.columns]
+            Raises:
+                ValueError: if no series has two distinct times
+
+            Returns:
+                str -- string alias representing granularity of pd.datetime object
+        """
+        return self._step_frequency(infer_time_step(times, series))
+
+    def _step_frequency(self, step):
+        """ private util function that maps the most common time step of the training series to 
+            the training frequency
+
+            Arguments:
+                step {int or None} -- time step in nanoseconds, None if there is none
+
+            Raises:
+                ValueError: if there is no time step
 
+            Returns:
+                str -- string alias representing granularity of pd.datetime object
+        """
+        if step is None:
+            raise ValueError("Cannot infer the frequency of series without two distinct time indices")
+        return frequency_alias(step / NS_PER_S)
+
+    def update(self, *, inputs: Inputs) -> CallResult[None]:
+        """ Appends observations that follow the training data to the fit regressions without 
+            refitting them from scratch. VARs keep their lag order and their coefficients are 
+            re-derived from updated least squares sufficient statistics, unless the one-step-ahead 
+            errors of the new observations indicate drift, in which case they are refit. ARIMA 
+            models are extended with their selected order.
+        
+            Arguments:
+                inputs {Inputs} -- D3M dataframe with the same columns as the training data, 
+                    containing observations after the end of the training data, observations 
+                    at or before the end of the training data are ignored
+            
+            Raises:
+                PrimitiveNotFittedError: if primitive not fit
+
+            Returns:
+                CallResult[None]
+        """
+
+        if not self._is_fit:
+            raise PrimitiveNotFittedError("Primitive not fitted.")
+
+        # drop index and grouping keys, parse times as in set_training_data
+        drop_idx = inputs.metadata.get_columns_with_semantic_type(
+            "https://metadata.datadrivendiscovery.org/types/PrimaryKey"
+        ) + inputs.metadata.get_columns_with_semantic_type(
+            "https://metadata.datadrivendiscovery.org/types/GroupingKey"
+        )
+        new_rows = self._project_columns(
+            inputs, [col for i, col in enumerate(list(inputs)) if i not in drop_idx]
+        )
+
+        # route groups to their top-level grouping key
+        if len(self.filter_idxs):
+            groups = new_rows.groupby(self.filter_idxs)
         else:
-            # find interpolation range from outermost grouping key
-            if len(grouping_keys) == 1:
-                date_ranges = inputs_copy.agg({self.time_column: ["min", "max"]})
-                indices = inputs[self.filter_idxs[0]].unique()
-                self.interpolation_ranges = pd.Series(
-                    [date_ranges] * len(indices), index=indices
-                )
-                self._X_train = [None]
-                self._X_train_names = [[]]
+            groups = [(None, new_rows)]
+        slot_groups = collections.defaultdict(dict)
+        for name, group in groups:
+            name = self._group_name(name)
+            try:
+                slot = self._get_group_slot(name)
+            except KeyError:
+                logger.warning(f"Group {name} was not seen during training, its rows are ignored")
+                continue
+            slot_groups[slot][name] = group.drop(columns=self.filter_idxs)
+
+        settings = self._fit_settings()
+        for slot, new_groups in slot_groups.items():
+            n_new = self._extend_training_slot(slot, new_groups)
+            if n_new:
+                self._update_regression(slot, n_new, settings)
+                self._reset_forecast_cache(slot)
+
+        return CallResult(None)
+
+    def _extend_training_slot(self, slot, new_groups):
+        """ private util function that appends new observations of the groups of a top-level 
+            grouping key to its training values, interpolated onto the training frequency
+
+            Arguments:
+                slot {int} -- index of the regression
+                new_groups {dict} -- group name -> new observations with time column
+
+            Returns:
+                int -- number of time steps appended
+        """
+        # observations at or before the last training time are already part of the training values
+        last_time = self._train_index[slot][-1]
+        new_groups = {
+            name: group[group[self.time_column] > last_time] for name, group in new_groups.items()
+        }
+        new_groups = {name: group for name, group in new_groups.items() if len(group)}
+        if not len(new_groups):
+            logger.warning(f"No observations after {last_time} in update of regression {slot}")
+            return 0
+        end_time = max(group[self.time_column].max() for group in new_groups.values())
+        index = frequency_grid(last_time, end_time, self.freq)
+        if len(index) < 2:
+            return 0
+
+        # groups are laid out side by side, with the same columns, in training order
+        names = self._X_train_names[slot] if len(self.filter_idxs) else [None]
+        positions = {name: i for i, name in enumerate(names)}
+        groups = []
+        for name, group in new_groups.items():
+            if name in positions:
+                groups.append((positions[name], group))
             else:
-                self.interpolation_ranges = inputs_copy.groupby(
-                    self.filter_idxs[:-1]
-                ).agg({self.time_column: ["min", "max"]})
-                self._X_train = [None for i in range(self.interpolation_ranges.shape[0])]
-                self._X_train_names = [[] for i in range(self.interpolation_ranges.shape[0])]
-            
-            for name, group in inputs_copy.groupby(self.filter_idxs):
-                if len(grouping_keys) > 2:
-                    group_value = tuple([group[self.filter_idxs[i]].values[0] for i in range(len(self.filter_idxs) - 1)])
-                else:
-                    group_value = group[self.filter_idxs[0]].values[0]
-                if len(grouping_keys) > 1:
-                    training_idx = np.where(
-                            self.interpolation_ranges.index.to_flat_index() == group_value
-                        )[0][0]
-                else:
-                    training_idx = 0
-                group = group.drop(columns=self.filter_idxs)
+                logger.warning(
+                    f"Group {name} has no training series in regression {slot}, its rows are ignored"
+                )
+        if not len(groups):
+            return 0
+        rows = pd.concat([group for i, group in groups])
+        series = np.concatenate([np.full(len(group), i) for i, group in groups])
+        times = datetime_nanoseconds(rows[self.time_column])
+        columns = [col for col in list(rows) if col != self.time_column]
+
+        # average new observations on the steps after the last training time and interpolate 
+        # from the last training observation, groups without new observations keep their last value
+        grid = datetime_nanoseconds(index)
+        values = self._values[slot]
+        block = grid_average(
+            grid_positions(times, np.zeros(len(times), dtype=np.int64), [grid[1:]]) + 1,
+            series,
+            rows[columns].values,
+            len(index),
+            len(names),
+        )
+        block[0] = values[-1]
+        block = interpolate_columns(block, grid)
 
-                # avg across duplicated time indices if necessary and re-index
-                if sum(group[self.time_column].duplicated()) > 0:
-                    group = group.groupby(self.time_column).mean()
-                else:
-                    group = group.set_index(self.time_column)
+        self._values[slot] = np.concatenate((values, block[1:]))
+        self._values_diff[slot] = np.concatenate(
+            (self._values_diff[slot], np.diff(block, axis=0))
+        )
+        self._train_index[slot] = self._train_index[slot].append(index[1:])
+        self._positive[slot] = self._positive[slot] or bool(np.min(block[1:]) < 0)
+        if self._interpolation_bounds is not None:
+            self._interpolation_bounds[slot] = (self._interpolation_bounds[slot][0], index[-1])
+        return len(index) - 1
 
-                # interpolate
-                min_date = self.interpolation_ranges.loc[group_value][self.time_column][
-                    "min"
-                ]
-                max_date = self.interpolation_ranges.loc[group_value][self.time_column][
-                    "max"
-                ]
-                # assume frequency is the same across all time series
-                if self.freq is None:
-                    self.freq = self._calculate_time_frequency(group.index[1] - group.index[0])
-                group = group.reindex(
-                    pd.date_range(min_date, max_date, freq = self.freq), 
-                    tolerance = '1' + self.freq, 
-                    method = 'nearest')
-                group = group.interpolate(method="time", limit_direction="both")
-
-                # add to training data under appropriate top-level grouping key
-                self.target_indices = [
-                    i
-                    for i, col_name in enumerate(list(group))
-                    if col_name in self._targets
-                ]
-                if self._X_train[training_idx] is None:
-                    self._X_train[training_idx] = group
-                else:
-                    self._X_train[training_idx] = pd.concat(
-                        [self._X_train[training_idx], group], axis=1
-                    )
-                self._X_train_names[training_idx].append(name)
+    def _update_regression(self, slot, n_new, settings):
+        """ private util function that updates a fit regression with the last n_new observations 
+            of its (extended) training values
+
+            Arguments:
+                slot {int} -- index of the regression
+                n_new {int} -- number of new observations
+                settings {dict} -- settings passed to _fit_regression, used if the VAR is refit
+        """
+        lags, fit = self._lag_order[slot], self._fits[slot]
+        vals, dates = self._values_diff[slot], self._train_index[slot]
+
+        # ARIMA, updated on a copy since fits are shared with the fit cache and exported params
+        if lags is None:
+            fit = copy.deepcopy(fit)
+            fit.update(vals[vals.shape[0] - n_new :, 0])
+            self._fits[slot] = fit
+            return
+
+        # penalized VARs have no least squares sufficient statistics, refit with their lag order
+        if lags > 0 and settings["var_estimator"] != "ols":
+            self._lag_order[slot], self._fits[slot] = _fit_penalized_regression(vals, settings, lags)
+            return
+
+        # VAR: test whether new observations are consistent with the fit model
+        n_old = vals.shape[0] - n_new
+        errors = vals[n_old:] - var_predict(vals[n_old - lags :], fit.params, lags)
+        try:
+            statistic = np.sum(errors.T * np.linalg.solve(fit.sigma_u, errors.T))
+            drift = stats.chi2.sf(statistic, errors.size) < self.hyperparams["update_drift_alpha"]
+        except (np.linalg.LinAlgError, ValueError):
+            drift = False
+
+        if drift:
+            logger.info(f"Drift detected in regression {slot}, refitting with lag order selection")
+            self._lag_order[slot], self._fits[slot] = _fit_regression(vals, dates, settings)
+            self._var_statistics[slot] = None
+            return
+
+        # same lag order, coefficients from updated sufficient statistics
+        if self._var_statistics[slot] is None:
+            self._var_statistics[slot] = VARStatistics(vals[:n_old], lags)
+        self._var_statistics[slot].add(vals, n_new)
+        try:
+            params, sigma_u = self._var_statistics[slot].solve()
+        except np.linalg.LinAlgError:
+            logger.debug(f"Singular sufficient statistics in regression {slot}, refitting")
+            self._lag_order[slot], self._fits[slot] = _fit_regression(vals, dates, settings)
+            self._var_statistics[slot] = None
+            return
+        state = export_fit(lags, fit)
+        state.update(params=params, sigma_u=sigma_u)
+        self._fits[slot] = restore_fit(lags, state, vals, dates)
 
     def fit(self, *, timeout: float = None, iterations: int = None) -> CallResult[None]:
         """ If there are multiple endogenous series, primitive will fit VAR model. Otherwise it will fit an ARIMA 
@@ -431,76 +1306,330 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
             overrides). 
         
             Keyword Arguments:
-                timeout {float} -- timeout, not considered (default: {None})
+                timeout {float} -- seconds within which to fit. Regressions are then fit serially, 
+                    cheapest first, and those that would not fit in the budget use cheap fallback 
+                    models. Per top-level grouping key timings are kept in 'fit_times' (default: {None})
                 iterations {int} -- iterations, not considered (default: {None})
             
             Returns:
-                CallResult[None]
+                CallResult[None] -- has_finished is False if any regression uses a fallback model
         """
 
+        fit_start = time.time()
+
+        # training DataFrames are dropped once their values are extracted, refitting reuses them
+        if self._X_train is not None:
+            self._train_index = [sequence.index for sequence in self._X_train]
+            self._values = [sequence.values for sequence in self._X_train]
+            self._X_train = None
+
         # mark if data is exclusively positive
-        self._values = [sequence.values for sequence in self._X_train]
         self._positive = [True if np.min(vals) < 0 else False for vals in self._values]
 
         # difference data - VAR assumes data is stationary
-        self._values_diff = [np.diff(sequence,axis=0) for sequence in self._X_train]
+        if self.hyperparams["memmap_dir"] is None:
+            self._values_diff = [np.diff(vals, axis=0) for vals in self._values]
+        else:
+            self._map_training_values()
+
+        settings = self._fit_settings()
+        tasks = [
+            (vals, dates, settings)
+            for vals, dates in zip(self._values_diff, self._train_index)
+        ]
+
+        # reuse regressions previously fit on the same values with the same settings
+        results = [None for i in range(len(tasks))]
+        fit_times = [(0.0, "cached") for i in range(len(tasks))]
+        if self.fit_cache is not None:
+            # the number of threads of the ARIMA order search doesn't change the fit models
+            cache_settings = {
+                name: value for name, value in settings.items() if name != "arima_threads"
+            }
+            keys = [FitCache.fingerprint(vals, cache_settings) for vals in self._values_diff]
+            for i, (key, (vals, dates, _)) in enumerate(zip(keys, tasks)):
+                entry = self.fit_cache.get(key)
+                if entry is not None:
+                    lags, state = entry
+                    results[i] = (lags, restore_fit(lags, state, vals, dates))
+
+        # fit remaining models, results are kept in the same order as the top-level grouping keys
+        pending = [i for i, result in enumerate(results) if result is None]
+        batch_start = time.time()
+        fitted = self._fit_batches([tasks[i] for i in pending])
+        batch_seconds = time.time() - batch_start
+        batched = [j for j, result in enumerate(fitted) if result is not None]
+        for j in batched:
+            fit_times[pending[j]] = (batch_seconds / len(batched), "batched")
+
+        remaining = [j for j, result in enumerate(fitted) if result is None]
+        remaining_tasks = [tasks[pending[j]] for j in remaining]
+        if timeout is None:
+            remaining_fits = self._fit_tasks(remaining_tasks)
+        else:
+            remaining_fits = self._fit_scheduled(remaining_tasks, fit_start + timeout)
+        for j, (result, seconds, model) in zip(remaining, remaining_fits):
+            fitted[j] = result
+            fit_times[pending[j]] = (seconds, model)
+
+        for i, result in zip(pending, fitted):
+            results[i] = result
+            if self.fit_cache is not None and fit_times[i][1] in ("full", "batched"):
+                self.fit_cache.put(keys[i], (result[0], export_fit(*result)))
+        if self.fit_cache is not None:
+            logger.info(f"Fit cache: {self.fit_cache.info()}")
+
+        self._lag_order = [lags for lags, _ in results]
+        self._fits = [fit for _, fit in results]
+        self._var_statistics = [None for lags in self._lag_order]
+        self._reset_forecast_cache()
+
+        # per top-level grouping key timings
+        slot_keys = {slot: key for key, slot in self._group_slots.items()}
+        self.fit_times = pd.DataFrame(
+            fit_times,
+            index=[slot_keys.get(i, i) for i in range(len(fit_times))],
+            columns=["seconds", "model"],
+        )
+        fallbacks = self.fit_times["model"].isin(["fallback", "drift"]).sum()
+        if fallbacks:
+            logger.info(
+                f"Fit budget exhausted, {fallbacks} of {len(tasks)} regressions use fallback models"
+            )
+
+        self._is_fit = True
+        return CallResult(None, has_finished=not fallbacks)
+
+    def _map_training_values(self, values_diff=None):
+        """ private util function that moves the training values and their differences into a 
+            single memory-mapped arena in 'memmap_dir', replacing the in-memory arrays. Forecasts 
+            only read the last values and lags of each regression from it. Regressions extended 
+            by update are kept in memory again
+
+            Keyword Arguments:
+                values_diff {Sequence[np array]} -- differenced values of each regression, computed 
+                    from the training values directly into the arena if None (default: {None})
+        """
+        n_slots = len(self._values)
+        arena = ValueArena(
+            [vals.shape for vals in self._values]
+            + [(vals.shape[0] - 1,) + vals.shape[1:] for vals in self._values],
+            self.hyperparams["memmap_dir"],
+        )
+        for slot, vals in enumerate(self._values):
+            arena[slot][...] = vals
+            if values_diff is None:
+                np.subtract(vals[1:], vals[:-1], out=arena[n_slots + slot])
+            else:
+                arena[n_slots + slot][...] = values_diff[slot]
+        arena.freeze()
+
+        self._arena = arena
+        self._values = [arena[slot] for slot in range(n_slots)]
+        self._values_diff = [arena[n_slots + slot] for slot in range(n_slots)]
+
+    def _reset_forecast_cache(self, slot=None):
+        """ private util function that discards cached forecasts and confidence intervals, 
+            after (some) regressions were fit or updated
+
+            Keyword Arguments:
+                slot {int} -- index of the only regression that changed, all if None 
+                    (default: {None})
+        """
+        if slot is None:
+            self._in_sample_fits = [None for fit in self._fits]
+            self._forecast_paths = [None for fit in self._fits]
+        else:
+            self._in_sample_fits[slot] = None
+            self._forecast_paths[slot] = None
+        self._interval_cache = None
+
+    def _forecast_path(self, slot, n_periods):
+        """ private util function that returns the in-sample predictions and future forecasts 
+            of a regression. The path is cached up to the longest horizon requested so far and 
+            only recomputed when a longer horizon is requested
+
+            Arguments:
+                slot {int} -- index of the regression
+                n_periods {int} -- number of periods to forecast into the future
+
+            Returns:
+                np array -- (in-sample + n_periods, K) undifferenced predictions, clipped if the 
+                    training data is non-negative, with INF values rounded to NA
+        """
+        fit, lags = self._fits[slot], self._lag_order[slot]
+        vals, vals_diff = self._values[slot], self._values_diff[slot]
+
+        # in-sample predictions
+        if self._in_sample_fits[slot] is None:
+            if lags is None:
+                in_sample = (vals[-1:], vals_diff[-1:], fit.predict_in_sample().reshape(-1,1))
+            else:
+                in_sample = (vals[-1:], vals_diff[len(vals_diff)-lags:], fit.fittedvalues)
+            self._in_sample_fits[slot] = np.concatenate(in_sample, axis = 0)
+        in_sample = self._in_sample_fits[slot]
+        n_rows = in_sample.shape[0] + n_periods
+
+        path = self._forecast_paths[slot]
+        if path is None or path.shape[0] < n_rows:
+
+            # produce future forecast using VAR / ARMA
+            if lags is not None and lags > 0:
+                pred = fit.forecast(y = vals_diff[vals_diff.shape[0]-fit.k_ar:], 
+                    steps = n_periods)
+            elif lags == 0:
+                pred = np.repeat(fit.params, n_periods, axis = 0)
+            else:
+                pred = fit.predict(n_periods = n_periods).reshape(-1,1)
+
+            # undo differencing transformation, apply invariances (real, positive data AND 
+            # rounding INF values)
+            path = np.concatenate((in_sample, pred), axis = 0).cumsum(axis = 0)
+            if not self._positive[slot]:
+                path = np.maximum(path, 0)
+            path[path == np.inf] = np.nan
+            self._forecast_paths[slot] = path
+        return path[:n_rows]
+
+    def _fit_settings(self):
+        """ hyperparameters relevant to fitting, shared by all regressions
 
-        # define models
+            Returns:
+                dict -- settings passed to _fit_regression
+        """
         if self.hyperparams["max_lag_order"] is None:
             arima_max_order = 5
         else:
             arima_max_order = self.hyperparams["max_lag_order"]
-        self.models = [
-            vector_ar(vals, dates=original.index)
-            if vals.shape[1] > 1
-            else Arima(
-                seasonal=self.hyperparams["seasonal"],
-                seasonal_differencing=self.hyperparams["seasonal_differencing"],
-                max_order=arima_max_order,
-                dynamic = self.hyperparams['dynamic']
-            )
-            for vals, original in zip(self._values_diff, self._X_train)
-        ]
+        return {
+            "max_lag_order": self.hyperparams["max_lag_order"],
+            "default_lag_order": self.hyperparams["default_lag_order"],
+            "seasonal": self.hyperparams["seasonal"],
+            "seasonal_differencing": self.hyperparams["seasonal_differencing"],
+            "arima_max_order": arima_max_order,
+            "dynamic": self.hyperparams["dynamic"],
+            "var_backend": self.hyperparams["var_backend"],
+            "var_estimator": self.hyperparams["var_estimator"],
+            "var_penalty": self.hyperparams["var_penalty"],
+            "arima_search": self.hyperparams["arima_search"],
+            "arima_max_fits": self.hyperparams["arima_max_fits"],
+            "arima_threads": self.hyperparams["arima_threads"],
+        }
 
-        # fit models
-        for vals, model, original in zip(self._values_diff, self.models, self._X_train):
+    def _fit_scheduled(self, tasks, deadline):
+        """ fits regressions serially, cheapest first, as long as the throughput of previous fits 
+            predicts that the next one finishes before the deadline (minus a reserve). Remaining 
+            regressions are fit with cheap fallback models, or drift once the deadline has passed
 
-            # VAR
-            if vals.shape[1] > 1:
-                try:
-                    lags = model.select_order(
-                        maxlags=self.hyperparams["max_lag_order"]
-                    ).aic
-                    logger.info(
-                        "Successfully performed model order selection. Optimal order = {} lags".format(
-                            lags
-                        )
-                    )
-                except np.linalg.LinAlgError:
-                    lags = self.hyperparams["default_lag_order"]
-                    logger.debug(
-                        f"Matrix decomposition error (maybe redundant columns in this grouping). Using default lag order of {lags}"
-                    )
-                except ValueError as e:
-                    lags = 0
-                    logger.debug('ValueError: ' + str(e) + '. Using lag order of 0')
-                self._lag_order.append(lags)
-                self._fits.append(model.fit(maxlags=lags))
+            Arguments:
+                tasks {Sequence[tuple]} -- arguments to _fit_regression, one per regression
+                deadline {float} -- time (as returned by time.time()) by which fitting should end
 
-            # ARIMA
+            Returns:
+                Sequence[tuple] -- (lag order, fit model), seconds and model type ('full', 'fallback'
+                    or 'drift'), in the same order as tasks
+        """
+        costs = [_fit_cost(*task) for task in tasks]
+        reserve = FIT_BUDGET_RESERVE * max(deadline - time.time(), 0)
+        spent_cost, spent_time = 0.0, 0.0
+        results = [None for i in range(len(tasks))]
+        for i in np.argsort(costs, kind="stable"):
+            start = time.time()
+            predicted = spent_time / spent_cost * costs[i] if spent_cost else 0.0
+            if start + predicted < deadline - reserve:
+                result, seconds = _timed_fit_regression(*tasks[i])
+                spent_cost += costs[i]
+                spent_time += seconds
+                results[i] = (result, seconds, "full")
             else:
-                X_train = pd.Series(
-                    data=vals.reshape((-1,)), index=original.index[: vals.shape[0]]
+                drift = start >= deadline
+                result = _fit_fallback(*tasks[i], drift=drift)
+                results[i] = (result, time.time() - start, "drift" if drift else "fallback")
+        return results
+
+    def _fit_batches(self, tasks):
+        """ fits multivariate regressions of identical shape together with the batched numpy 
+            VAR engine. Only used with the 'numpy' VAR backend and the 'ols' VAR estimator
+
+            Arguments:
+                tasks {Sequence[tuple]} -- arguments to _fit_regression, one per regression
+
+            Returns:
+                Sequence[tuple(int, VARFit) or None] -- lag order and fit model, in the same order 
+                    as tasks. None for regressions that should be fit individually
+        """
+        results = [None for i in range(len(tasks))]
+        if (
+            self.hyperparams["var_backend"] != "numpy"
+            or self.hyperparams["var_estimator"] != "ols"
+        ):
+            return results
+
+        shapes = collections.defaultdict(list)
+        for i, (vals, _, _) in enumerate(tasks):
+            if vals.shape[1] > 1:
+                shapes[vals.shape].append(i)
+
+        for shape, idxs in shapes.items():
+            if len(idxs) < 2:
+                continue
+            try:
+                batch = fit_var_batch(
+                    np.stack([tasks[i][0] for i in idxs]),
+                    maxlags=self.hyperparams["max_lag_order"],
                 )
-                model.fit(X_train)
-                self._lag_order.append(None)
-                self._fits.append(model)
+            except ValueError as e:
+                logger.debug(f"ValueError: {e}. Fitting {len(idxs)} regressions individually")
+                continue
+            for i, result in zip(idxs, batch):
+                results[i] = result
+            logger.info(
+                f"Fit {sum(result is not None for result in batch)} of {len(idxs)} VARs of shape {shape} in a batch"
+            )
+        return results
 
-        self._is_fit = True
-        return CallResult(None, has_finished=self._is_fit)
+    def _fit_tasks(self, tasks):
+        """ fits regressions in worker processes if 'n_jobs' allows it, serially otherwise
+
+            Arguments:
+                tasks {Sequence[tuple]} -- arguments to _fit_regression, one per regression
+
+            Returns:
+                Sequence[tuple] -- (lag order, fit model), seconds and model type ('full'), in the 
+                    same order as tasks
+        """
+        n_jobs = self.hyperparams["n_jobs"]
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = min(n_jobs, len(tasks))
+        if n_jobs > 1:
+            try:
+                return [(*timed, "full") for timed in self._fit_parallel(tasks, n_jobs)]
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+                logger.warning(
+                    f"Parallel fitting failed ({e}), falling back to fitting regressions serially"
+                )
+        return [(*_timed_fit_regression(*task), "full") for task in tasks]
+
+    @classmethod
+    def _fit_parallel(
+        cls, tasks, n_jobs
+    ):
+        """ fits each regression in a separate worker process
+
+            Arguments:
+                tasks {Sequence[tuple]} -- arguments to _fit_regression, one per regression
+                n_jobs {int} -- number of worker processes
+
+            Returns:
+                Sequence[tuple] -- (lag order, fit model) and seconds, in the same order as tasks
+        """
+        logger.info(f"Fitting {len(tasks)} regressions with {n_jobs} worker processes")
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(_timed_fit_regression, *zip(*tasks)))
 
     def _calculate_prediction_intervals(
-        self, inputs: Inputs, grouping_key_ct: int
+        self, inputs: Inputs, grouping_key_ct: int, key_name: str
     ) -> typing.Tuple[
         typing.Sequence[int],
         typing.Sequence[typing.Sequence[int]],
@@ -526,27 +1655,18 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
             group_tuple = inputs.groupby(self.filter_idxs)
 
         # groupby learned filter_idxs and extract n_periods, interval and d3mIndex information
-        n_periods = [1 for i in range(len(self._X_train))]
-        intervals = [None for i in range(len(self._X_train))]
-        d3m_indices = [None for i in range(len(self._X_train))]
-        for _, group in group_tuple:
-            if grouping_key_ct > 2:
-                group_value = tuple([group[self.filter_idxs[i]].values[0] for i in range(len(self.filter_idxs) - 1)])
-                testing_idx = np.where(
-                    self.interpolation_ranges.index.to_flat_index() == group_value
-                )[0][0]
-            else:
-                testing_idx = 0
-            min_train_idx = self._X_train[testing_idx].index[0]
-            time_diff = (
-                self._X_train[testing_idx].index[1] - min_train_idx
-            ).total_seconds()
+        n_periods = [1 for i in range(len(self._train_index))]
+        intervals = [None for i in range(len(self._train_index))]
+        d3m_indices = [None for i in range(len(self._train_index))]
+        for name, group in group_tuple:
+            testing_idx = self._get_group_slot(name)
+            min_train_idx = self._train_index[testing_idx][0]
             local_intervals = self._discretize_time_difference(
                 group[self.time_column], min_train_idx, self.freq
             )
 
             # save n_periods prediction information
-            num_p = int(max(local_intervals) - self._X_train[testing_idx].shape[0] + 1)
+            num_p = int(max(local_intervals) - len(self._train_index[testing_idx]) + 1)
             if n_periods[testing_idx] < num_p:
                 n_periods[testing_idx] = num_p
 
@@ -557,7 +1677,7 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
                 intervals[testing_idx].append(local_intervals)
 
             # save d3m indices prediction information
-            idxs = group.iloc[:, self.key[0]].values
+            idxs = group[key_name].values
             if d3m_indices[testing_idx] is None:
                 d3m_indices[testing_idx] = [idxs]
             else:
@@ -565,51 +1685,44 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
 
         return n_periods, intervals, d3m_indices
 
-    @classmethod
-    def _calculate_time_frequency(
-        cls, time_diff
-    ):
-        """method that calculates the frequency of a datetime difference (for prediction slices) 
-        
+    @staticmethod
+    def _group_name(name):
+        """ private util function that names a group produced by groupby on filter_idxs like 
+            set_training_data does: pandas names the groups of a single grouping key by 1-tuples 
+            (since 1.5), which are unwrapped
+
             Arguments:
-                time_diff {timedelta} -- difference between two instances
-            
+                name {Any} -- group name, as produced by groupby on filter_idxs
+
             Returns:
-                str -- string alias representing granularity of pd.datetime object
+                Any -- group name, as stored in _X_train_names
+        """
+        if isinstance(name, tuple) and len(name) == 1:
+            return name[0]
+        return name
+
+    def _get_group_slot(self, name):
+        """ private util function that finds the training slot (index of the regression) of a group 
+            from the group key -> slot hash index built in set_training_data
+
+            Arguments:
+                name {Any} -- group name, as produced by groupby on filter_idxs
+
+            Returns:
+                int -- index of the group's regression in _X_train / _fits
         """
-        time_diff = time_diff.total_seconds()
-        if time_diff % S_PER_YEAR_0 == 0:
-            logger.debug("granularity is years")
-            return 'YS'
-        elif time_diff % S_PER_YEAR_1 == 0:
-            logger.debug("granularity is years")
-            return 'YS'
-        elif time_diff % S_PER_MONTH_31 == 0:
-            logger.debug("granularity is months 31")
-            return 'M'
-        elif time_diff % S_PER_MONTH_30 == 0:
-            logger.debug("granularity is months 30")
-            return 'M'
-        elif time_diff % S_PER_MONTH_28 == 0:
-            logger.debug("granularity is months 28")
-            return 'M'
-        elif time_diff % S_PER_WEEK == 0:
-            logger.debug("granularity is weeks")
-            return 'W'
-        elif time_diff % S_PER_DAY == 0:
-            logger.debug("granularity is days")
-            return 'D'
-        elif time_diff % S_PER_HR == 0:
-            logger.debug("granularity is hours")
-            return 'H'
+        if len(self.filter_idxs) > 2:
+            group_value = tuple(name[:-1])
+        elif len(self.filter_idxs) == 2:
+            group_value = name[0]
         else:
-            logger.debug("granularity is seconds")
-            return 'S'
+            return 0
+        return self._group_slots[group_value]
 
     @classmethod
     def _discretize_time_difference(
         cls, times, initial_time, frequency
-    ) -> typing.Sequence[int]:
+    ) -> np.ndarray:
         """method that discretizes sequence of datetimes (for prediction slices) 
         
             Arguments:
@@ -619,26 +1732,11 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
                 frequency {str} -- string alias representing granularity of pd.datetime object
             
             Returns:
-                typing.Sequence[int] -- prediction intervals expressed at specific time granularity
+                np.ndarray -- (N,) int64 prediction intervals expressed at specific time granularity
 
         """
 
-        # take differences to convert to timedeltas
-        time_differences = times - initial_time
-        time_differences = time_differences.apply(lambda t: t.total_seconds())
-
-        if frequency == 'YS':
-            return [round(x / S_PER_YEAR_0) for x in time_differences]
-        elif frequency == 'M':
-            return [round(x / S_PER_MONTH_30) for x in time_differences]
-        elif frequency == 'W':
-            return [round(x / S_PER_WEEK) for x in time_differences]
-        elif frequency == 'D':
-            return [round(x / S_PER_DAY) for x in time_differences]
-        elif frequency == 'H':
-            return [round(x / S_PER_HR) for x in time_differences]
-        else:
-            return [round(x / SECONDS_PER_MINUTE) for x in time_differences]
+        return discretize_datetimes(times, initial_time, frequency)
 
     def produce(
         self, *, inputs: Inputs, timeout: float = None, iterations: int = None
@@ -662,84 +1760,59 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
         if not self._is_fit:
             raise PrimitiveNotFittedError("Primitive not fitted.")
 
-        # make copy of input data!
-        inputs_copy = inputs.copy()
-
-        # if datetime columns are integers, parse as # of days
-        if self.integer_time:
-            inputs_copy[self.time_column] = pd.to_datetime(
-                inputs_copy[self.time_column] - 1, unit="D"
-            )
-        else:
-            inputs_copy[self.time_column] = pd.to_datetime(
-                inputs_copy[self.time_column], unit="s"
-            )
-
-        # sort by time column
-        inputs_copy = inputs_copy.sort_values(by = [self.time_column])
+        # project key, time and grouping key columns, sorted by time
+        key_name = list(inputs)[self.key[0]]
+        inputs_copy = self._project_columns(
+            inputs, [key_name, self.time_column] + list(self.filter_idxs)
+        )
 
         # intelligently calculate grouping key order - by highest number of unique vals after grouping
-        grouping_keys = inputs_copy.metadata.get_columns_with_semantic_type(
+        grouping_keys = inputs.metadata.get_columns_with_semantic_type(
             "https://metadata.datadrivendiscovery.org/types/SuggestedGroupingKey"
         )
 
         # groupby learned filter_idxs and extract n_periods, interval and d3mIndex information
         n_periods, intervals, d3m_indices = self._calculate_prediction_intervals(
-            inputs_copy, len(grouping_keys)
+            inputs_copy, len(grouping_keys), key_name
         )
 
-        # produce future forecast using VAR / ARMA
-        future_forecasts = [
-            fit.forecast(y = vals[vals.shape[0]-fit.k_ar:], 
-                steps = n)
-            if lags is not None and lags > 0
-            else np.repeat(fit.params, n, axis = 0)
-            if lags == 0 
-            else fit.predict(n_periods = n).reshape(-1,1)
-            for fit, vals, lags, n in zip(
-                self._fits, self._values_diff, self._lag_order, n_periods
-            )
-        ]
-
-        # prepend in-sample predictions
-        future_forecasts = [
-            np.concatenate((vals[-1:], vals_diff[-1:], fit.predict_in_sample().reshape(-1,1), pred), axis = 0)
-            if lags is None
-            else np.concatenate((vals[-1:], vals_diff[len(vals_diff)-lags:], fit.fittedvalues, pred), axis = 0)
-            for fit, pred, lags, vals, vals_diff
-            in zip(self._fits, future_forecasts, self._lag_order, self._values, self._values_diff)
-        ]
-
-        # undo differencing transformation, convert to df
-        future_forecasts = [pd.DataFrame(future_forecast.cumsum(axis=0)) for future_forecast in future_forecasts]
-
-        # apply invariances (real, positive data AND rounding NA / INF values)
-        future_forecasts = [
-            f.clip(lower = 0).replace(np.inf, np.nan)
-            if not positive 
-            else f.replace(np.inf, np.nan)
-            for f, positive in zip(future_forecasts, self._positive)
-        ]
-        future_forecasts = [f.fillna(f.mean()) for f in future_forecasts]
-
-        # select predictions to return based on intervals
+        # select predictions to return based on intervals - gather the (row, col) positions of
+        # all requested prediction slices and take them from each forecast matrix at once
         key_names = [list(inputs)[k] for k in self.key]
-        var_df = pd.DataFrame([], columns=key_names + self._targets)
-
-        for forecast, interval, idxs in zip(future_forecasts, intervals, d3m_indices):
-            #logger.debug(f'forecast shape: {forecast.shape}')
-            if interval is not None:
-                for row, col, d3m_idx in zip(interval, range(len(interval)), idxs):
-                    # if new col in test (endogenous variable), average over all other cols
-                    if col >= forecast.shape[1]:
-                        #logger.debug('Needed new forecast column!')
-                        preds = forecast.mean(axis = 1).replace(np.inf, MAX_INT)
-                        preds = pd.concat([preds] * len(self.target_indices), axis=1)
-                    else:
-                        cols = [col + t for t in self.target_indices]
-                        preds = forecast[cols]
-                    for r, i in zip(row, d3m_idx):
-                        var_df.loc[var_df.shape[0]] = [i, *preds.iloc[r].values]
+        target_indices = np.array(self.target_indices).reshape(1, -1)
+        all_preds, all_idxs = [], []
+        for slot, (n, interval, idxs) in enumerate(zip(n_periods, intervals, d3m_indices)):
+            if interval is None:
+                continue
+
+            # in-sample predictions and future forecast using VAR / ARMA, rounding NA values
+            forecast = pd.DataFrame(self._forecast_path(slot, n))
+            if forecast.isnull().values.any():
+                forecast = forecast.fillna(forecast.mean())
+
+            rows = np.concatenate([np.asarray(row, dtype=int) for row in interval])
+            series = np.repeat(np.arange(len(interval)), [len(row) for row in interval])
+            cols = series.reshape(-1, 1) + target_indices
+            forecast_vals = forecast.values
+
+            # if new col in test (endogenous variable), average over all other cols
+            new_cols = series >= forecast.shape[1]
+            if new_cols.any():
+                means = forecast.mean(axis = 1).replace(np.inf, MAX_INT).values
+                forecast_vals = np.concatenate((forecast_vals, means.reshape(-1, 1)), axis = 1)
+                cols[new_cols] = forecast.shape[1]
+
+            all_preds.append(forecast_vals[rows.reshape(-1, 1), cols])
+            all_idxs.append(np.concatenate(idxs))
+
+        if len(all_preds) > 0:
+            all_preds = np.concatenate(all_preds, axis = 0)
+            all_idxs = np.concatenate(all_idxs)
+        else:
+            all_preds = np.empty((0, target_indices.shape[1]))
+            all_idxs = np.empty((0,), dtype = int)
+        var_df = pd.DataFrame(all_preds, columns=self._targets)
+        var_df.insert(0, key_names[0], all_idxs)
         var_df = d3m_DataFrame(var_df)
         var_df.iloc[:, 0] = var_df.iloc[:, 0].astype(int)
 
@@ -860,6 +1933,63 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
             has_finished=self._is_fit,
         )
 
+    def _calculate_confidence_intervals(self, horizon, alpha):
+        """ private util function that produces confidence intervals for all series of all 
+            regressions 'horizon' periods into the future
+
+            Arguments:
+                horizon {int} -- number of periods to forecast into the future
+                alpha {float} -- significance level of the intervals
+
+            Returns:
+                np array -- (series, horizon, 3) undifferenced mean, lower and upper bounds
+        """
+
+        # preallocate (series, horizon, [mean, lower, upper]) array for all regressions
+        n_series = [vals.shape[1] for vals in self._values]
+        offsets = np.cumsum([0] + n_series)
+        intervals = np.empty((offsets[-1], horizon, 3))
+        q = stats.norm.ppf(1 - alpha / 2)
+
+        # produce confidence interval forecasts using VAR / ARIMA
+        for fit, vals, lags, start, end in zip(
+            self._fits, self._values_diff, self._lag_order, offsets[:-1], offsets[1:]
+        ):
+            if lags is not None and lags > 0:
+                interval = fit.forecast_interval(y = vals[-fit.k_ar:], 
+                    steps = horizon, 
+                    alpha = alpha)
+            elif lags == 0:
+                interval = (
+                    fit.params, 
+                    fit.params - q * fit.stderr, 
+                    fit.params + q * fit.stderr
+                )
+            else:
+                interval = fit.predict(n_periods = horizon, 
+                    return_conf_int = True, 
+                    alpha = alpha)
+            for i, point_estimate in enumerate(interval):
+                intervals[start:end, :, i] = np.reshape(point_estimate, (-1, end - start)).T
+
+        # undo differencing transformations
+        last_values = np.concatenate([vals[-1] for vals in self._values])
+        intervals = intervals.cumsum(axis = 1) + last_values[:, np.newaxis, np.newaxis]
+
+        # apply invariances (real, positive data AND rounding NA / INF values)
+        nonnegative = np.repeat([not positive for positive in self._positive], n_series)
+        intervals[nonnegative] = np.maximum(intervals[nonnegative], 0)
+        intervals[intervals == np.inf] = np.nan
+
+        # fill NA values with the mean of their regression
+        missing = np.isnan(intervals)
+        sums = np.add.reduceat(np.where(missing, 0, intervals).sum(axis = 1), offsets[:-1])
+        counts = np.add.reduceat((~missing).sum(axis = 1), offsets[:-1])
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            means = np.repeat(sums / counts, n_series, axis = 0)
+        intervals = np.where(missing, means[:, np.newaxis, :], intervals)
+        return intervals
+
     def produce_confidence_intervals(
         self, *, inputs: Inputs, timeout: float = None, iterations: int = None
     ) -> CallResult[Outputs]:
@@ -894,76 +2024,26 @@ class VAR(SupervisedLearnerPrimitiveBase[Inputs, Outputs, Params, Hyperparams]):
         horizon = self.hyperparams['confidence_interval_horizon']
         alpha = self.hyperparams['confidence_interval_alpha']
 
-        # produce confidence interval forecasts using VAR / ARIMA
-        confidence_intervals = []
-        for fit, vals, lags in zip(self._fits, self._values_diff, self._lag_order):
-            if lags is not None and lags > 0:
-                confidence_intervals.append(
-                    fit.forecast_interval(y = vals[-fit.k_ar:], 
-                        steps = horizon, 
-                        alpha = alpha)
-                )
-            elif lags == 0:
-                q = stats.norm.ppf(1 - alpha / 2)
-                mean = np.repeat(fit.params, horizon, axis = 0)
-                lower = np.repeat(fit.params - q * fit.stderr, horizon, axis = 0)
-                upper = np.repeat(fit.params + q * fit.stderr, horizon, axis = 0)
-                confidence_intervals.append(
-                    (mean, lower, upper)
-                )
-            else:
-                confidence_intervals.append(
-                    fit.predict(n_periods = horizon, 
-                        return_conf_int = True, 
-                        alpha = alpha)
-                )
-
-        # undo differencing transformations
-        confidence_intervals = [
-            [
-                point_estimate.cumsum(axis=0) + vals[-1:, ]
-                for point_estimate in interval
-            ]
-            for interval, vals in zip(confidence_intervals, self._values)
-        ]
-
-        # combine into long form df
-        series_names = [
-            [[name] * horizon for name in name_list] 
-            for name_list in self._X_train_names
-        ]
-        series_names = [
-            [name for sub_name_list in name_list for name in sub_name_list] 
-            for name_list in series_names
-        ]        
-        confidence_intervals = [
-            pd.DataFrame(
-                    np.concatenate(
-                    [
-                        point_estimate.flatten(order = 'F').reshape(-1, 1)    
-                        for point_estimate in interval
-                    ], 
-                    axis = 1
-                ), 
-                index = names, 
-                columns = ['mean', str(alpha / 2), str(1 - alpha / 2)]
+        # confidence intervals are cached until regressions are fit or updated
+        if self._interval_cache is None or self._interval_cache[0] != (horizon, alpha):
+            self._interval_cache = (
+                (horizon, alpha), self._calculate_confidence_intervals(horizon, alpha)
             )
-            for interval, names in zip(confidence_intervals, series_names)
-        ]
+        intervals = self._interval_cache[1]
 
-        # apply invariances (real, positive data AND rounding NA / INF values)
-        confidence_intervals = [
-            ci.clip(lower = 0).replace(np.inf, np.nan)
-            if not positive 
-            else ci.replace(np.inf, np.nan)
-            for ci, positive in zip(confidence_intervals, self._positive)
-        ]
-        confidence_intervals = [ci.fillna(ci.mean()) for ci in confidence_intervals]
-
-        interval_df = pd.concat(confidence_intervals)
+        # combine into long form df, copying the cached intervals so that callers can't modify them
+        series_names = pd.Index(
+            [name for name_list in self._X_train_names for name in name_list]
+        )
+        interval_df = pd.DataFrame(
+            intervals.reshape(-1, 3), 
+            index = series_names.repeat(horizon), 
+            columns = ['mean', str(alpha / 2), str(1 - alpha / 2)],
+            copy = True,
+        )
 
         # add index column
-        interval_df['horizon_index'] = np.tile(np.arange(horizon), len(interval_df.index.unique()))
+        interval_df['horizon_index'] = np.tile(np.arange(horizon), intervals.shape[0])
 
         # TODO: add metadata to interval_df??
         return CallResult(
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("d3m")
+
+from d3m import container
+from d3m.exceptions import PrimitiveNotFittedError
+from d3m.metadata import base as metadata_base
+
+from TimeSeriesD3MWrappers.primitives.forecasting_var import VAR, Hyperparams
+
+SEMANTIC_TYPES = {
+    "d3mIndex": (
+        "http://schema.org/Integer",
+        "https://metadata.datadrivendiscovery.org/types/PrimaryKey",
+    ),
+    "region": ("https://metadata.datadrivendiscovery.org/types/SuggestedGroupingKey",),
+    "item": ("https://metadata.datadrivendiscovery.org/types/SuggestedGroupingKey",),
+    "time": ("https://metadata.datadrivendiscovery.org/types/Time",),
+    "value": (
+        "http://schema.org/Float",
+        "https://metadata.datadrivendiscovery.org/types/TrueTarget",
+    ),
+}
+
+
+def _make_df(n_regions, n_items, n_obs, start=0, seed=0):
+    """ long-form daily integrated AR(1) series, one per (region, item) """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for region in range(n_regions):
+        for item in range(n_items):
+            differences = rng.normal(size=start + n_obs)
+            for t in range(1, len(differences)):
+                differences[t] += 0.7 * differences[t - 1]
+            values = np.cumsum(differences)[start:] + 10 * region + item
+            for t, value in enumerate(values):
+                rows.append((f"r{region}", f"i{item}", (start + t) * 86400, value + 100))
+    df = pd.DataFrame(rows, columns=["region", "item", "time", "value"])
+    df.insert(0, "d3mIndex", np.arange(len(df)))
+    return df
+
+
+def _to_d3m(df):
+    """ D3M dataframe with the semantic types of the columns of df """
+    frame = container.DataFrame(df.reset_index(drop=True), generate_metadata=True)
+    for i, column in enumerate(df.columns):
+        frame.metadata = frame.metadata.update(
+            (metadata_base.ALL_ELEMENTS, i),
+            {"name": column, "semantic_types": SEMANTIC_TYPES[column]},
+        )
+    return frame
+
+
+def _make_frame(n_regions, n_items, n_obs, start=0, seed=0):
+    """ D3M dataframe of daily integrated AR(1) series, one per (region, item) """
+    return _to_d3m(_make_df(n_regions, n_items, n_obs, start=start, seed=seed))
+
+
+def _fit(train, **hyperparams):
+    var = VAR(hyperparams=Hyperparams.defaults().replace(hyperparams))
+    var.set_training_data(inputs=train, outputs=None)
+    var.fit()
+    return var
+
+
+def _predict(var, test):
+    return np.asarray(var.produce(inputs=test).value.iloc[:, 1], dtype=float)
+
+
+def _fit_produce(train, test, **hyperparams):
+    var = _fit(train, **hyperparams)
+    predictions = np.asarray(var.produce(inputs=test).value.iloc[:, 1], dtype=float)
+    intervals = var.produce_confidence_intervals(inputs=train).value.values[:, :3]
+    return predictions, intervals.astype(float)
+
+
+@pytest.mark.parametrize("n_regions, n_items", [(3, 2), (4, 3)])
+def test_numpy_backend_matches_statsmodels(n_regions, n_items):
+    train = _make_frame(n_regions, n_items, 60, seed=1)
+    test = _make_frame(n_regions, n_items, 10, start=60, seed=2)
+
+    predictions, intervals = _fit_produce(train, test, var_backend="numpy")
+    expected_predictions, expected_intervals = _fit_produce(
+        train, test, var_backend="statsmodels"
+    )
+
+    np.testing.assert_allclose(predictions, expected_predictions, rtol=1e-8)
+    np.testing.assert_allclose(intervals, expected_intervals, rtol=1e-8)
+
+
+@pytest.mark.parametrize(
+    "n_items, columns",
+    [
+        (1, ["d3mIndex", "region", "time", "value"]),
+        (2, ["d3mIndex", "region", "item", "time", "value"]),
+    ],
+)
+def test_update_matches_refit_on_full_history(n_items, columns):
+    history = _make_df(3, n_items, 68, seed=1)[columns]
+    train = history[history["time"] < 60 * 86400]
+    new_rows = history[history["time"] >= 60 * 86400]
+    test = _to_d3m(_make_df(3, n_items, 10, start=68, seed=2)[columns])
+
+    var = _fit(_to_d3m(train))
+    before = _predict(var, test)
+    var.update(inputs=_to_d3m(new_rows))
+
+    refit = _fit(_to_d3m(history))
+    assert var._lag_order == refit._lag_order
+    np.testing.assert_allclose(_predict(var, test), _predict(refit, test), rtol=1e-8)
+    assert not np.allclose(_predict(var, test), before)
+
+
+def test_params_round_trip_into_fresh_primitive():
+    train = _make_frame(3, 2, 60, seed=1)
+    test = _make_frame(3, 2, 10, start=60, seed=2)
+    var = _fit(train)
+
+    restored = VAR(hyperparams=Hyperparams.defaults())
+    restored.set_params(params=var.get_params())
+
+    np.testing.assert_array_equal(_predict(restored, test), _predict(var, test))
+    np.testing.assert_array_equal(
+        restored.produce_confidence_intervals(inputs=train).value.values,
+        var.produce_confidence_intervals(inputs=train).value.values,
+    )
+
+
+def test_params_of_unfit_primitive_round_trip():
+    train = _make_frame(3, 2, 60, seed=1)
+    var = VAR(hyperparams=Hyperparams.defaults())
+    fresh_params = var.get_params()
+    var.set_training_data(inputs=train, outputs=None)
+
+    for params in (fresh_params, var.get_params()):
+        restored = VAR(hyperparams=Hyperparams.defaults())
+        restored.set_params(params=params)
+        assert not restored.get_params()["is_fit"]
+        with pytest.raises(PrimitiveNotFittedError):
+            restored.produce(inputs=train)
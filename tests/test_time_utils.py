@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from TimeSeriesD3MWrappers.models.time_utils import (
+    discretize_datetimes,
+    discretize_numeric_times,
+)
+
+S_PER_DAY = 24 * 60 * 60
+
+# seconds per discretization period of every frequency alias
+DATETIME_PERIODS = {
+    "YS": 365 * S_PER_DAY,
+    "M": 30 * S_PER_DAY,
+    "W": 7 * S_PER_DAY,
+    "D": S_PER_DAY,
+    "H": 60 * 60,
+    "min": 60,
+    "S": 1,
+}
+
+# (training time step, seconds per discretization period) of every granularity
+NUMERIC_PERIODS = [
+    (365 * S_PER_DAY, 365 * S_PER_DAY),
+    (366 * S_PER_DAY, 365 * S_PER_DAY),
+    (31 * S_PER_DAY, 30 * S_PER_DAY),
+    (30 * S_PER_DAY, 30 * S_PER_DAY),
+    (28 * S_PER_DAY, 30 * S_PER_DAY),
+    (7 * S_PER_DAY, 7 * S_PER_DAY),
+    (14 * S_PER_DAY, 7 * S_PER_DAY),
+    (S_PER_DAY, S_PER_DAY),
+    (3 * 60 * 60, 60 * 60),
+    (15 * 60, 60),
+    (30, 1),
+    (0.5, 1),
+]
+
+
+def _random_offsets(period, seed=0):
+    """ offsets in seconds around multiples of a period, including exact half periods """
+    rng = np.random.default_rng(seed)
+    multiples = rng.integers(-5, 50, size=200)
+    fractions = rng.choice([0, 0.25, 0.5, 0.75], size=200)
+    jitter = rng.integers(-3, 4, size=200)
+    return (multiples + fractions) * period + jitter
+
+
+@pytest.mark.parametrize("frequency", list(DATETIME_PERIODS))
+def test_discretize_datetimes_matches_elementwise_rounding(frequency):
+    period = DATETIME_PERIODS[frequency]
+    initial_time = pd.Timestamp("2000-01-01")
+    times = initial_time + pd.to_timedelta(_random_offsets(period), unit="s")
+
+    intervals = discretize_datetimes(times, initial_time, frequency)
+
+    expected = [round((t - initial_time).total_seconds() / period) for t in times]
+    assert intervals.dtype == np.int64
+    np.testing.assert_array_equal(intervals, expected)
+
+
+@pytest.mark.parametrize("time_diff, period", NUMERIC_PERIODS)
+def test_discretize_numeric_times_matches_elementwise_truncation(time_diff, period):
+    initial_time = 946684800
+    times = initial_time + _random_offsets(period, seed=1)
+
+    intervals = discretize_numeric_times(times, initial_time, time_diff)
+
+    expected = [int((t - initial_time) / period) - 1 for t in times]
+    assert intervals.dtype == np.int64
+    np.testing.assert_array_equal(intervals, expected)
+
+
+def test_discretize_numeric_times_integer_timestamps():
+    times = np.arange(10, 20)
+
+    intervals = discretize_numeric_times(times, 9, 1, integer_timestamps=True)
+
+    np.testing.assert_array_equal(intervals, np.arange(10))
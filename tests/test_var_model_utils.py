@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from statsmodels.tsa.api import VAR as vector_ar
+
+from TimeSeriesD3MWrappers.models.var_model_utils import (
+    FitCache,
+    VARFit,
+    export_fit,
+    fit_var_batch,
+    select_var_order,
+)
+
+
+def _simulate_var(n_obs, k, lags, seed):
+    """ simulates a stable VAR with a constant, or a random walk if lags is 0 """
+    rng = np.random.default_rng(seed)
+    coefs = rng.normal(scale=0.4 / max(lags, 1) / np.sqrt(k), size=(lags, k, k))
+    intercept = rng.normal(size=k)
+    endog = np.zeros((n_obs + 50, k))
+    for t in range(lags, len(endog)):
+        endog[t] = intercept + rng.normal(size=k)
+        for lag in range(lags):
+            endog[t] += coefs[lag] @ endog[t - lag - 1]
+    if lags == 0:
+        endog = np.cumsum(endog, axis=0)
+    return endog[50:]
+
+
+CASES = [
+    (60, 2, 1, 0),
+    (80, 2, 2, 1),
+    (120, 3, 1, 2),
+    (200, 2, 3, 3),
+    (40, 4, 0, 4),
+    (150, 5, 2, 5),
+]
+
+
+@pytest.mark.parametrize("n_obs, k, lags, seed", CASES)
+@pytest.mark.parametrize("maxlags", [None, 2, 5])
+def test_select_var_order_matches_statsmodels(n_obs, k, lags, seed, maxlags):
+    endog = _simulate_var(n_obs, k, lags, seed)
+
+    expected = vector_ar(endog).select_order(maxlags=maxlags).aic
+
+    assert select_var_order(endog, maxlags=maxlags) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_select_var_order_of_ill_conditioned_series_matches_statsmodels(seed):
+    endog = _simulate_var(100, 3, 2, seed)
+    endog[:, 2] = endog[:, 0] + 1e-6 * np.random.default_rng(seed).normal(size=len(endog))
+
+    expected = vector_ar(endog).select_order(maxlags=4).aic
+
+    assert select_var_order(endog, maxlags=4) == expected
+
+
+@pytest.mark.parametrize("n_obs, k, lags, seed", CASES)
+def test_var_fit_matches_statsmodels(n_obs, k, lags, seed):
+    endog = _simulate_var(n_obs, k, lags, seed)
+    k_ar = max(lags, 1)
+
+    fit = VARFit(endog, k_ar)
+    expected = vector_ar(endog).fit(k_ar)
+
+    assert fit.k_ar == expected.k_ar
+    assert fit.nobs == expected.nobs
+    np.testing.assert_allclose(fit.params, expected.params, rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(fit.coefs, expected.coefs, rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(fit.sigma_u, expected.sigma_u, rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(fit.stderr, expected.stderr, rtol=1e-6, atol=1e-10)
+    np.testing.assert_allclose(
+        fit.fittedvalues, expected.fittedvalues, rtol=1e-8, atol=1e-10
+    )
+
+
+@pytest.mark.parametrize("n_obs, k, lags, seed", CASES)
+def test_var_fit_forecasts_match_statsmodels(n_obs, k, lags, seed):
+    endog = _simulate_var(n_obs, k, lags, seed)
+    k_ar, steps = max(lags, 1), 12
+
+    fit = VARFit(endog, k_ar)
+    expected = vector_ar(endog).fit(k_ar)
+
+    np.testing.assert_allclose(
+        fit.forecast(endog, steps), expected.forecast(endog, steps), rtol=1e-8, atol=1e-10
+    )
+    np.testing.assert_allclose(fit.mse(steps), expected.mse(steps), rtol=1e-8, atol=1e-10)
+    for values, expected_values in zip(
+        fit.forecast_interval(endog, steps, alpha=0.1),
+        expected.forecast_interval(endog, steps, alpha=0.1),
+    ):
+        np.testing.assert_allclose(values, expected_values, rtol=1e-8, atol=1e-10)
+
+
+def test_var_fit_restored_from_params_matches_fit():
+    endog = _simulate_var(100, 3, 2, 7)
+    fit = VARFit(endog, 2)
+
+    restored = VARFit(endog, 2, params=fit.params, sigma_u=fit.sigma_u)
+
+    np.testing.assert_array_equal(restored.forecast(endog, 5), fit.forecast(endog, 5))
+    np.testing.assert_array_equal(restored.mse(5), fit.mse(5))
+
+
+@pytest.mark.parametrize("n_obs, k, maxlags", [(60, 2, None), (100, 3, 4), (40, 1, 3)])
+def test_fit_var_batch_matches_single_series_fits(n_obs, k, maxlags):
+    endogs = np.stack(
+        [_simulate_var(n_obs, k, 1 + seed % 3, seed) for seed in range(12)]
+    )
+
+    results = fit_var_batch(endogs, maxlags=maxlags)
+
+    for endog, result in zip(endogs, results):
+        assert result is not None
+        lags, fit = result
+        assert lags == select_var_order(endog, maxlags=maxlags)
+        expected = VARFit(endog, lags)
+        np.testing.assert_allclose(fit.params, expected.params, rtol=1e-6, atol=1e-8)
+        np.testing.assert_allclose(fit.sigma_u, expected.sigma_u, rtol=1e-6, atol=1e-8)
+        np.testing.assert_allclose(
+            fit.forecast(endog, 5), expected.forecast(endog, 5), rtol=1e-6, atol=1e-8
+        )
+
+
+def test_fit_var_batch_leaves_ill_conditioned_series_to_single_fits():
+    endogs = np.stack([_simulate_var(80, 2, 1, seed) for seed in range(3)])
+    endogs[1, :, 1] = endogs[1, :, 0]
+
+    results = fit_var_batch(endogs, maxlags=2)
+
+    assert results[1] is None
+    assert results[0] is not None and results[2] is not None
+
+
+def test_fit_cache_persists_var_fits_without_pickle(tmp_path):
+    endog = _simulate_var(80, 2, 1, 0)
+    fit = VARFit(endog, 1)
+    key = FitCache.fingerprint(endog, {"var_backend": "numpy"})
+    FitCache(cache_dir=str(tmp_path)).put(key, (1, export_fit(1, fit)))
+    FitCache(cache_dir=str(tmp_path)).put("arima", (None, {"arima": object()}))
+
+    lags, state = FitCache(cache_dir=str(tmp_path)).get(key)
+
+    assert [path.name for path in tmp_path.iterdir()] == [key + ".npz"]
+    assert lags == 1 and state["k_ar"] == 1 and state["backend"] == "numpy"
+    np.testing.assert_array_equal(state["params"], fit.params)
+    np.testing.assert_array_equal(state["sigma_u"], fit.sigma_u)